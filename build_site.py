@@ -0,0 +1,296 @@
+"""
+描画済みのウェブサイト (index.html) と、使っているユーティリティクラスだけを含む CSS (site.css) を作る。
+
+site_template.html はブラウザで Tailwind Play CDN を読み込み、hel-data.js からメニュー・お知らせ・
+新着コンテンツ・カードを描画する。build-site はこれらを生成時に HTML にしておき、
+  - 描画用のスクリプト (data-build="client-render") と hel-data.js の読み込みを取り除く
+  - Tailwind Play CDN (data-build="tailwind-cdn") を、Tailwind CSS の CLI で作った site.css に置き換える
+ので、閲覧者のブラウザでは CSS のコンパイルも JS での描画も行わずに最初の表示ができる。
+開閉ボタンやトップへ戻るボタンなどの操作用のスクリプトはそのまま残る。
+配信するサイトは hel-data.js を読まない（hel-data.js はテンプレートを直接開いて確認するときに使う）。
+site_output.mode が "production" なら、最初の表示に使う index.html と site.css の .gz / .br も作る。
+
+Tailwind CSS の CLI (standalone 版、または pip install tailwindcss-bin) は site_build.tailwind_cli で指定する。
+見つからないときは警告を表示し、Play CDN を読み込んだまま（描画だけ済ませた）index.html を書き出す。
+
+    python helhub.py build-site
+"""
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+import subprocess
+
+from config_util import load_config
+from db_util import connect
+from generate_data_js import (build_hel_data, write_if_changed, write_precompressed, remove_precompressed,
+                              site_output_mode, precompressed_extensions, GeneratedFile)
+
+# config.json の site_build で上書きできる
+DEFAULT_SITE_BUILD_SETTINGS = {
+    "template": "site_template.html",
+    "output": "index.html",
+    "stylesheet": "site.css",
+    "tailwind_cli": "tailwindcss",  # Tailwind CSS v3 / v4 の CLI（PATH 上の名前か実行ファイルのパス）
+}
+
+# カードで最初から表示する件数（site_template.html の VISIBLE_ITEMS_DEFAULT と合わせる）
+VISIBLE_ITEMS_DEFAULT = 5
+
+_MENU_ITEM_CLASS = ("flex items-center gap-1.5 px-3 py-1.5 text-sm font-medium text-gray-600 "
+                    "hover:bg-gray-200 hover:text-gray-900 rounded-md transition-colors")
+_FIXED_ITEM_ICON = ('<svg xmlns="http://www.w3.org/2000/svg" width="16" height="16" viewBox="0 0 24 24" fill="none" '
+                    'stroke="currentColor" stroke-width="2.5" stroke-linecap="round" stroke-linejoin="round" '
+                    'class="flex-shrink-0 w-4 h-4 text-slate-400" title="固定項目"><path d="M15 4.5l-3-3-3 3"/>'
+                    '<path d="M12 2v12.5"/><path d="M17 14h-2.5a2.5 2.5 0 0 0-5 0H7"/><path d="M12 22v-6"/></svg>')
+_ITEM_ICON = ('<svg class="flex-shrink-0 w-4 h-4 mt-1 text-blue-400" xmlns="http://www.w3.org/2000/svg" fill="none" '
+              'viewBox="0 0 24 24" stroke-width="2" stroke="currentColor"><path stroke-linecap="round" '
+              'stroke-linejoin="round" d="M9 12.75L11.25 15 15 9.75M21 12a9 9 0 11-18 0 9 9 0 0118 0z" /></svg>')
+
+_CLIENT_RENDER_RE = re.compile(
+    r'[ \t]*<!--(?:(?!-->).)*data-build="client-render"(?:(?!-->).)*-->[ \t]*\n'
+    r'|[ \t]*<script\b[^>]*\bdata-build="client-render"[^>]*>.*?</script>[ \t]*\n', re.S)
+_TAILWIND_CDN_RE = re.compile(r'<script\b[^>]*\bdata-build="tailwind-cdn"[^>]*>\s*</script>')
+_STYLESHEET_STAMP_RE = re.compile(r'/\* build-site ([0-9a-f]{64}) \*/')
+
+
+def _site_build_settings(config):
+    settings = dict(DEFAULT_SITE_BUILD_SETTINGS)
+    settings.update(config.get("site_build", {}))
+    return settings
+
+
+def output_files(config):
+    """build-site が書き出すファイル（deploy の配信対象）。site.css は作れたときだけ"""
+    settings = _site_build_settings(config)
+    files = [settings["output"]]
+    if os.path.exists(settings["stylesheet"]):
+        files.append(settings["stylesheet"])
+    if site_output_mode(config) == 'production':
+        files += [f"{path}.{ext}" for path in files for ext in precompressed_extensions()]
+    return files
+
+
+# --- 描画（site_template.html の generateMenu / generateAnnouncements / generateNewContent / generateCards と同じ HTML） ---
+
+def render_menu(cards):
+    return "".join(
+        f'<a href="#{card["id"]}" class="{_MENU_ITEM_CLASS}">{card["icon"]} '
+        f'<span class="hidden sm:inline">{card["shortTitle"]}</span></a>'
+        for card in cards)
+
+
+def render_announcements(announcements):
+    items = []
+    for index, item in enumerate(announcements):
+        badge = ' <span class="new-badge">NEW</span>' if index == 0 else ''
+        items.append(f"<li>{item}{badge}</li>")
+    return "".join(items)
+
+
+def render_new_content(new_content, cards):
+    card_by_id = {card["id"]: card for card in cards}
+    items = []
+    for item in new_content:
+        card = card_by_id.get(item["media"])
+        if card is None:
+            continue
+        items.append(f'''
+                    <li><a href="{item["url"]}" class="flex items-center gap-3 p-2 rounded-md hover:bg-gray-100 transition-colors group">
+                        <span class="flex-shrink-0 w-8 h-8 rounded-full {card["bgColor"]} flex items-center justify-center text-gray-600 group-hover:scale-110 transition-transform">{card["icon"]}</span>
+                        <div>
+                            <span class="font-semibold text-blue-700 group-hover:underline">{item["title"]}</span>
+                            <span class="text-xs text-gray-500 block">{card["title"]}</span>
+                        </div>
+                    </a></li>''')
+    return "".join(items)
+
+
+def _render_items(items):
+    html = []
+    for index, item in enumerate(items):
+        hidden = 'is-hidden' if index >= VISIBLE_ITEMS_DEFAULT else ''
+        children = ''
+        if item.get("children"):
+            children = f'<ul class="pl-5 mt-2 space-y-2">{_render_items(item["children"])}</ul>'
+        icon = _FIXED_ITEM_ICON if item.get("isFixed") else _ITEM_ICON
+        html.append(f'''<li class="list-item {hidden}">
+                            <a href="{item["url"]}" class="flex items-start gap-2 text-gray-700 hover:text-blue-600">
+                                {icon}
+                                <span class="hover:underline">{item["title"]}</span>
+                            </a>
+                            {children}
+                        </li>''')
+    return "".join(html)
+
+
+def render_cards(cards):
+    html = []
+    for index, card in enumerate(cards):
+        items = card.get("contentItems") or []
+        toggle = ''
+        if len(items) > VISIBLE_ITEMS_DEFAULT:
+            more = f"さらに{len(items) - VISIBLE_ITEMS_DEFAULT}件表示..."
+            toggle = (f'<button class="toggle-content mt-4 text-sm font-semibold text-blue-600 hover:text-blue-800" '
+                      f'data-show-text="{more}" data-hide-text="閉じる">{more}</button>')
+        archive = ''
+        if (card.get("archiveCount") or 0) > sum(1 for item in items if not item.get("isFixed")):
+            archive = (f'<ul class="archive-list mt-3 space-y-3" hidden></ul>'
+                       f'<button class="load-archive mt-4 text-sm font-semibold text-blue-600 hover:text-blue-800 '
+                       f'disabled:text-gray-400" data-media="{card["id"]}">過去の記事を読み込む (全{card["archiveCount"]}件)</button>')
+        icon = card["icon"].replace('width="24"', 'width="32"').replace('height="24"', 'height="32"')
+        html.append(f'''
+            <div style="--card-index: {index};" id="{card["id"]}" class="card {card["bgColor"]} rounded-xl overflow-hidden shadow-lg flex flex-col">
+                    <div class="p-6">
+                        <a href="{card["link"]}" class="flex items-center gap-3 mb-3 group">
+                            <span class="text-blue-700 group-hover:scale-110 transition-transform">{icon}</span>
+                            <h3 class="text-xl font-bold text-blue-900 group-hover:underline">{card["title"]}</h3>
+                        </a>
+                        <p class="text-gray-600 mb-5">{card["description"]}</p>
+                    </div>
+                    <div class="px-6 pb-6 flex-grow flex flex-col">
+                        <ul class="content-list space-y-3 flex-grow">{_render_items(items)}</ul>
+                        {toggle}
+                        {archive}
+                    </div>
+            </div>''')
+    return "".join(html)
+
+
+def _fill(html, element_id, inner):
+    """id が element_id の空の要素の中に inner を入れる"""
+    pattern = re.compile(r'(<(\w+)\b[^>]*\bid="' + re.escape(element_id) + r'"[^>]*>)\s*(</\2>)')
+    html, count = pattern.subn(lambda m: m.group(1) + inner + m.group(3), html, count=1)
+    if not count:
+        print(f"警告: テンプレートに id=\"{element_id}\" の空の要素が無いため、描画を省略しました。")
+    return html
+
+
+def render_page(template, hel_data):
+    """テンプレートに helData を描画し、描画用のスクリプトを取り除いた HTML を返す"""
+    cards = hel_data["cards"]
+    html = _fill(template, "main-menu", render_menu(cards))
+    html = _fill(html, "announcements-list", render_announcements(hel_data.get("announcements") or []))
+    html = _fill(html, "new-content-list", render_new_content(hel_data["newContent"], cards))
+    html = _fill(html, "card-grid", render_cards(cards))
+    return _CLIENT_RENDER_RE.sub('', html)
+
+
+# --- CSS ---
+
+def _find_tailwind_cli(settings):
+    cli = settings.get("tailwind_cli")
+    if not cli:
+        return None
+    return shutil.which(cli) or (cli if os.path.isfile(cli) else None)
+
+
+def _tailwind_major_version(cli):
+    """CLI のヘルプ表示からメジャーバージョンを読む（読めなければ Play CDN と同じ 3）"""
+    result = subprocess.run([cli, "--help"], capture_output=True, text=True, encoding="utf-8",
+                            errors="replace", timeout=60)
+    match = re.search(r"tailwindcss v(\d+)", result.stdout + result.stderr)
+    return int(match.group(1)) if match else 3
+
+
+def build_stylesheet(page, settings):
+    """
+    page で使っているクラスだけを含む最小化した CSS を settings["stylesheet"] に書き出し、
+    結果を GeneratedFile で返す（CLI が無い・失敗した場合は None）。
+    page が前回と同じなら CLI は実行しない（site.css の先頭に page のハッシュを記録してある）。
+    """
+    cli = _find_tailwind_cli(settings)
+    if cli is None:
+        print(f"警告: Tailwind CSS の CLI ({settings.get('tailwind_cli')}) が見つからないため、"
+              "site.css を作らずに Play CDN を使います。site_build.tailwind_cli を設定してください。")
+        return None
+
+    path = settings["stylesheet"]
+    page_hash = hashlib.sha256(page.encode("utf-8")).hexdigest()
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            css = f.read()
+        match = _STYLESHEET_STAMP_RE.match(css[:100].decode("ascii", "replace"))
+        if match and match.group(1) == page_hash:
+            print(f"'{path}' は使っているクラスが前回と同じため、作り直しませんでした。")
+            return GeneratedFile(path, False, hashlib.sha256(css).hexdigest())
+
+    major = _tailwind_major_version(cli)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        page_path = os.path.join(tmp_dir, "page.html")
+        input_path = os.path.join(tmp_dir, "input.css")
+        output_path = os.path.join(tmp_dir, "site.css")
+        with open(page_path, "w", encoding="utf-8") as f:
+            f.write(page)
+        command = [cli, "-i", input_path, "-o", output_path, "--minify"]
+        with open(input_path, "w", encoding="utf-8") as f:
+            if major >= 4:
+                f.write('@import "tailwindcss" source(none);\n@source "./page.html";\n')
+            else:
+                f.write("@tailwind base;\n@tailwind components;\n@tailwind utilities;\n")
+                command += ["--content", page_path]
+        result = subprocess.run(command, cwd=tmp_dir, capture_output=True, text=True, encoding="utf-8",
+                                errors="replace", timeout=300)
+        if result.returncode != 0 or not os.path.exists(output_path):
+            print(f"!!! エラー: Tailwind CSS の CLI が失敗しました (終了コード {result.returncode})。Play CDN を使います。")
+            print(result.stderr.strip())
+            return None
+        with open(output_path, "rb") as f:
+            css = f"/* build-site {page_hash} */\n".encode("ascii") + f.read()
+
+    written = write_if_changed(path, css)
+    print(f"'{path}' を作成しました (Tailwind CSS v{major}, {len(css) / 1024:.1f} KB)。")
+    return written
+
+
+def build_site(config=None, conn=None):
+    """
+    描画済みの index.html と site.css を作る。結果を GeneratedFile で返す（中断した場合は None）。
+    config / conn を渡すとそれを使う（conn は閉じない）。update-web のパイプライン用。
+    """
+    if config is None:
+        config = load_config()
+    settings = _site_build_settings(config)
+    if not os.path.exists(settings["template"]):
+        print(f"!!! エラー: テンプレート '{settings['template']}' が見つかりません。")
+        return None
+    with open(settings["template"], "r", encoding="utf-8") as f:
+        template = f.read()
+
+    owns_conn = conn is None
+    if owns_conn:
+        conn = connect(config=config)
+    try:
+        hel_data = build_hel_data(config, conn)
+    finally:
+        if owns_conn:
+            conn.close()
+
+    page = render_page(template, hel_data)
+    stylesheet = build_stylesheet(page, settings)
+    if stylesheet is not None:
+        # 内容が変わったら URL も変わるので、ブラウザに古い CSS が残らない
+        link = f'<link rel="stylesheet" href="{settings["stylesheet"]}?v={stylesheet.sha256[:10]}">'
+        page = _TAILWIND_CDN_RE.sub(lambda m: link, page, count=1)
+
+    payload = page.encode("utf-8")
+    result = write_if_changed(settings["output"], payload)
+    if result.changed:
+        print(f"'{result.path}' を作成しました ({len(payload) / 1024:.1f} KB)。")
+    else:
+        print(f"'{result.path}' は前回と同じ内容のため、書き換えませんでした。")
+
+    if site_output_mode(config) == 'production':
+        write_precompressed(result, payload)
+        if stylesheet is not None:
+            with open(stylesheet.path, "rb") as f:
+                write_precompressed(stylesheet, f.read())
+    else:
+        remove_precompressed(settings["output"])
+        remove_precompressed(settings["stylesheet"])
+    return result
+
+
+if __name__ == '__main__':
+    build_site()
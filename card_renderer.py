@@ -0,0 +1,410 @@
+"""
+X 投稿用のカード画像をブラウザを使わずに描画する（image_settings.mode が "card" のとき）。
+
+Chromium でページを開いてスクリーンショットを撮る代わりに、config.json の
+media_templates にあるメディア名・アイコン (SVG)・背景色 (bgColor) と、
+記事のタイトル・日付だけから 1200x675 の PNG を Pillow で直接描く。
+1枚あたり数十ミリ秒で、描画に使った入力のハッシュをファイル名にしてキャッシュする。
+"""
+import os
+import re
+import json
+import math
+import hashlib
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+from datetime_util import parse_utcish, get_zone
+
+# Pillow は任意（無ければカードを作らない）。fetch の起動を遅くしないよう、
+# カードを描くときに _import_pillow() で初めてインポートする
+Image = ImageDraw = ImageFont = None
+
+# 描画内容を変えたら上げる（キャッシュのハッシュに含まれる）
+CARD_RENDERER_VERSION = 1
+
+CARD_SIZE = (1200, 675)
+
+# config.json の card_settings で上書きできる
+DEFAULT_CARD_SETTINGS = {
+    "output_dir": "cards",
+    "site_name": "The HEL Hub",
+    # 日本語を描けるフォントを先頭から順に探す (Windows / macOS / Linux)
+    "font_paths": [
+        "C:/Windows/Fonts/YuGothB.ttc",
+        "C:/Windows/Fonts/meiryob.ttc",
+        "C:/Windows/Fonts/meiryo.ttc",
+        "C:/Windows/Fonts/msgothic.ttc",
+        "/System/Library/Fonts/ヒラギノ角ゴシック W6.ttc",
+        "/System/Library/Fonts/Hiragino Sans GB.ttc",
+        "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+        "/usr/share/fonts/noto-cjk/NotoSansCJK-Bold.ttc",
+        "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
+    ],
+}
+
+# media_templates の bgColor (Tailwind のクラス名) → (背景色, アクセント色)
+# アクセント色は同じ色相の 600 番
+TAILWIND_COLORS = {
+    "amber": ("#fffbeb", "#d97706"),
+    "sky": ("#f0f9ff", "#0284c7"),
+    "blue": ("#eff6ff", "#2563eb"),
+    "rose": ("#fff1f2", "#e11d48"),
+    "red": ("#fef2f2", "#dc2626"),
+    "teal": ("#f0fdfa", "#0d9488"),
+    "indigo": ("#eef2ff", "#4f46e5"),
+    "purple": ("#faf5ff", "#9333ea"),
+    "gray": ("#f3f4f6", "#4b5563"),
+    "green": ("#f0fdf4", "#16a34a"),
+}
+_DEFAULT_COLORS = TAILWIND_COLORS["gray"]
+TEXT_COLOR = "#1f2937"
+MUTED_TEXT_COLOR = "#6b7280"
+
+
+def _import_pillow():
+    """Pillow を読み込む。使えなければ False"""
+    global Image, ImageDraw, ImageFont
+    if Image is None:
+        try:
+            from PIL import Image, ImageDraw, ImageFont
+        except ImportError:
+            return False
+    return True
+
+
+def _card_settings(settings):
+    merged = dict(DEFAULT_CARD_SETTINGS)
+    merged.update(settings or {})
+    return merged
+
+
+def _colors_for(bg_class):
+    """'bg-amber-50' → ('#fffbeb', '#d97706')。未知の色はグレー"""
+    m = re.match(r"bg-([a-z]+)-\d+$", bg_class or "")
+    return TAILWIND_COLORS.get(m.group(1), _DEFAULT_COLORS) if m else _DEFAULT_COLORS
+
+
+def _find_font_path(font_paths):
+    for path in font_paths:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def _load_font(font_path, size):
+    if font_path:
+        return ImageFont.truetype(font_path, size)
+    # 日本語フォントが見つからない場合（英数字しか描けない）
+    return ImageFont.load_default(size)
+
+
+# --- SVG アイコン (lucide 形式: stroke のみの線画) の簡易描画 ---
+
+_PATH_TOKEN = re.compile(r"[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_PATH_ARG_COUNTS = {"M": 2, "L": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "T": 2, "A": 7, "Z": 0}
+
+
+def _bezier(points, steps=12):
+    """制御点のリストからベジェ曲線上の点を返す（始点は含めない）"""
+    result = []
+    for i in range(1, steps + 1):
+        t = i / steps
+        pts = list(points)
+        while len(pts) > 1:
+            pts = [((1 - t) * x0 + t * x1, (1 - t) * y0 + t * y1)
+                   for (x0, y0), (x1, y1) in zip(pts, pts[1:])]
+        result.append(pts[0])
+    return result
+
+
+def _arc(start, rx, ry, rotation, large_arc, sweep, end, steps=16):
+    """SVG の円弧 (A コマンド) を折れ線にする（SVG 仕様 F.6.5 の中心座標への変換）"""
+    (x1, y1), (x2, y2) = start, end
+    if rx == 0 or ry == 0 or start == end:
+        return [end]
+    phi = math.radians(rotation)
+    cos_phi, sin_phi = math.cos(phi), math.sin(phi)
+    dx, dy = (x1 - x2) / 2, (y1 - y2) / 2
+    x1p = cos_phi * dx + sin_phi * dy
+    y1p = -sin_phi * dx + cos_phi * dy
+    rx, ry = abs(rx), abs(ry)
+    scale = (x1p ** 2) / (rx ** 2) + (y1p ** 2) / (ry ** 2)
+    if scale > 1:
+        rx, ry = rx * math.sqrt(scale), ry * math.sqrt(scale)
+    num = rx ** 2 * ry ** 2 - rx ** 2 * y1p ** 2 - ry ** 2 * x1p ** 2
+    den = rx ** 2 * y1p ** 2 + ry ** 2 * x1p ** 2
+    coef = math.sqrt(max(0.0, num / den)) if den else 0.0
+    if large_arc == sweep:
+        coef = -coef
+    cxp, cyp = coef * rx * y1p / ry, -coef * ry * x1p / rx
+    cx = cos_phi * cxp - sin_phi * cyp + (x1 + x2) / 2
+    cy = sin_phi * cxp + cos_phi * cyp + (y1 + y2) / 2
+
+    def angle(ux, uy, vx, vy):
+        return math.atan2(ux * vy - uy * vx, ux * vx + uy * vy)
+
+    theta1 = angle(1, 0, (x1p - cxp) / rx, (y1p - cyp) / ry)
+    delta = angle((x1p - cxp) / rx, (y1p - cyp) / ry, (-x1p - cxp) / rx, (-y1p - cyp) / ry)
+    if not sweep and delta > 0:
+        delta -= 2 * math.pi
+    elif sweep and delta < 0:
+        delta += 2 * math.pi
+
+    points = []
+    for i in range(1, steps + 1):
+        theta = theta1 + delta * i / steps
+        x, y = rx * math.cos(theta), ry * math.sin(theta)
+        points.append((cos_phi * x - sin_phi * y + cx, sin_phi * x + cos_phi * y + cy))
+    return points
+
+
+def _path_to_polylines(d):
+    """SVG の path の d 属性を折れ線（点のリスト）のリストに変換する"""
+    tokens = _PATH_TOKEN.findall(d)
+    polylines, current = [], []
+    x = y = start_x = start_y = 0.0
+    last_ctrl = None
+    command = None
+    i = 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+        upper = command.upper()
+        relative = command.islower()
+        count = _PATH_ARG_COUNTS[upper]
+        args = [float(t) for t in tokens[i:i + count]]
+        i += count
+
+        ox, oy = (x, y) if relative else (0.0, 0.0)
+        ctrl = None
+        if upper == "M":
+            if len(current) > 1:
+                polylines.append(current)
+            x, y = args[0] + ox, args[1] + oy
+            start_x, start_y = x, y
+            current = [(x, y)]
+            command = "l" if relative else "L"  # M の後に続く座標は L として扱う
+        elif upper == "Z":
+            current.append((start_x, start_y))
+            polylines.append(current)
+            x, y = start_x, start_y
+            current = [(x, y)]
+        elif upper == "L":
+            x, y = args[0] + ox, args[1] + oy
+            current.append((x, y))
+        elif upper == "H":
+            x = args[0] + ox
+            current.append((x, y))
+        elif upper == "V":
+            y = args[0] + oy
+            current.append((x, y))
+        elif upper in ("C", "S"):
+            if upper == "C":
+                c1 = (args[0] + ox, args[1] + oy)
+                rest = args[2:]
+            else:
+                c1 = (2 * x - last_ctrl[0], 2 * y - last_ctrl[1]) if last_ctrl else (x, y)
+                rest = args
+            c2 = (rest[0] + ox, rest[1] + oy)
+            end = (rest[2] + ox, rest[3] + oy)
+            current.extend(_bezier([(x, y), c1, c2, end]))
+            ctrl = c2
+            x, y = end
+        elif upper in ("Q", "T"):
+            if upper == "Q":
+                c1 = (args[0] + ox, args[1] + oy)
+                end = (args[2] + ox, args[3] + oy)
+            else:
+                c1 = (2 * x - last_ctrl[0], 2 * y - last_ctrl[1]) if last_ctrl else (x, y)
+                end = (args[0] + ox, args[1] + oy)
+            current.extend(_bezier([(x, y), c1, end]))
+            ctrl = c1
+            x, y = end
+        elif upper == "A":
+            end = (args[5] + ox, args[6] + oy)
+            current.extend(_arc((x, y), args[0], args[1], args[2], bool(args[3]), bool(args[4]), end))
+            x, y = end
+        last_ctrl = ctrl
+    if len(current) > 1:
+        polylines.append(current)
+    return polylines
+
+
+def _svg_to_polylines(svg):
+    """lucide 形式の SVG から、描くべき折れ線のリストを返す（解釈できない要素は無視）"""
+    polylines = []
+    try:
+        root = ET.fromstring(svg)
+    except ET.ParseError:
+        return polylines
+    for elem in root.iter():
+        tag = elem.tag.split("}")[-1]
+        get = lambda name: float(elem.get(name, 0))
+        if tag == "path":
+            polylines.extend(_path_to_polylines(elem.get("d", "")))
+        elif tag == "line":
+            polylines.append([(get("x1"), get("y1")), (get("x2"), get("y2"))])
+        elif tag in ("polyline", "polygon"):
+            nums = [float(n) for n in re.findall(r"[-+]?(?:\d+\.?\d*|\.\d+)", elem.get("points", ""))]
+            points = list(zip(nums[0::2], nums[1::2]))
+            if tag == "polygon" and points:
+                points.append(points[0])
+            polylines.append(points)
+        elif tag == "circle":
+            cx, cy, r = get("cx"), get("cy"), get("r")
+            polylines.append([(cx + r * math.cos(2 * math.pi * i / 32), cy + r * math.sin(2 * math.pi * i / 32))
+                              for i in range(33)])
+        elif tag == "rect":
+            x, y, w, h = get("x"), get("y"), get("width"), get("height")
+            polylines.append([(x, y), (x + w, y), (x + w, y + h), (x, y + h), (x, y)])
+    return polylines
+
+
+def _draw_icon(draw, svg, origin, size, color):
+    """24x24 の viewBox を前提に、SVG アイコンを origin から size ピクセル四方に描く"""
+    scale = size / 24
+    width = max(2, round(2 * scale))
+    ox, oy = origin
+    for points in _svg_to_polylines(svg):
+        scaled = [(ox + px * scale, oy + py * scale) for px, py in points]
+        draw.line(scaled, fill=color, width=width, joint="curve")
+        r = width / 2  # 線の端を丸める
+        for px, py in (scaled[0], scaled[-1]):
+            draw.ellipse((px - r, py - r, px + r, py + r), fill=color)
+
+
+# --- テキストの折り返し ---
+
+def _wrap_text(draw, text, font, max_width, max_lines):
+    """
+    1文字ずつ幅を足して折り返す（日本語は空白で区切れないため）。
+    max_lines に収まらなければ最終行の末尾を「…」にする。
+    """
+    char_widths = {}
+    lines, line, line_width = [], "", 0.0
+    for char in text:
+        if char not in char_widths:
+            char_widths[char] = draw.textlength(char, font=font)
+        if line_width + char_widths[char] <= max_width:
+            line += char
+            line_width += char_widths[char]
+            continue
+        lines.append(line)
+        line = char.lstrip()
+        line_width = char_widths[char] if line else 0.0
+        if len(lines) == max_lines:
+            break
+    else:
+        if line:
+            lines.append(line)
+        return lines
+
+    last = lines[-1]
+    while last and draw.textlength(last + "…", font=font) > max_width:
+        last = last[:-1]
+    lines[-1] = last + "…"
+    return lines
+
+
+def _format_date(published_date):
+    """DB の ISO8601 (UTC) を日本時間の「2025年10月23日」にする"""
+    if not published_date:
+        return ""
+    dt = parse_utcish(published_date)
+    if dt is None:
+        return published_date
+    dt = dt.astimezone(get_zone("Asia/Tokyo"))
+    return f"{dt.year}年{dt.month}月{dt.day}日"
+
+
+def _card_inputs(media_id, media_info, title, published_date, settings, font_path):
+    """カードの見た目を決める入力（キャッシュのハッシュに使う）"""
+    return {
+        "version": CARD_RENDERER_VERSION,
+        "size": CARD_SIZE,
+        "media_id": media_id,
+        "media_title": media_info.get("title", media_id),
+        "icon": media_info.get("icon", ""),
+        "bgColor": media_info.get("bgColor", ""),
+        "title": title,
+        "date": _format_date(published_date),
+        "site_name": settings["site_name"],
+        "font": font_path,
+    }
+
+
+def card_path_for(inputs, output_dir):
+    digest = hashlib.sha256(json.dumps(inputs, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+    return os.path.join(output_dir, f"card_{inputs['media_id']}_{digest[:16]}.png")
+
+
+def _draw_card(inputs, font_path):
+    bg_color, accent = _colors_for(inputs["bgColor"])
+    width, height = CARD_SIZE
+    image = Image.new("RGB", CARD_SIZE, bg_color)
+    draw = ImageDraw.Draw(image)
+
+    margin = 72
+    # 左端のアクセントの帯
+    draw.rectangle((0, 0, 16, height), fill=accent)
+
+    # 上部: アイコン + メディア名
+    icon_size = 56
+    _draw_icon(draw, inputs["icon"], (margin, margin - 8), icon_size, accent)
+    media_font = _load_font(font_path, 34)
+    draw.text((margin + icon_size + 20, margin + 20), inputs["media_title"],
+              font=media_font, fill=accent, anchor="lm")
+
+    # 中央: タイトル（最大3行）
+    title_font = _load_font(font_path, 64)
+    lines = _wrap_text(draw, inputs["title"], title_font, width - margin * 2, max_lines=3)
+    line_height = 88
+    top = margin + icon_size + 60
+    for i, line in enumerate(lines):
+        draw.text((margin, top + i * line_height), line, font=title_font, fill=TEXT_COLOR)
+
+    # 下部: 日付とサイト名
+    footer_font = _load_font(font_path, 30)
+    footer_y = height - margin + 8
+    draw.line((margin, footer_y - 44, width - margin, footer_y - 44), fill=accent, width=2)
+    draw.text((margin, footer_y), inputs["date"], font=footer_font, fill=MUTED_TEXT_COLOR, anchor="ls")
+    draw.text((width - margin, footer_y), inputs["site_name"], font=footer_font, fill=accent, anchor="rs")
+    return image
+
+
+def render_card(media_id, media_info, title, published_date=None, settings=None):
+    """
+    カード画像を描いて保存し、パスを返す。同じ入力のカードが既にあれば描かずにそのパスを返す。
+    Pillow が無い場合は None を返す。
+    """
+    if not _import_pillow():
+        print("警告: Pillow がインストールされていないため、カード画像を作成できません。")
+        return None
+    settings = _card_settings(settings)
+    font_path = _find_font_path(settings["font_paths"])
+    inputs = _card_inputs(media_id, media_info or {}, title, published_date, settings, font_path)
+
+    path = card_path_for(inputs, settings["output_dir"])
+    if os.path.exists(path):
+        return path
+
+    if font_path is None:
+        print("警告: 日本語フォントが見つかりません。card_settings.font_paths を設定してください。")
+    os.makedirs(settings["output_dir"], exist_ok=True)
+    tmp_path = path + ".tmp"
+    _draw_card(inputs, font_path).save(tmp_path, format="PNG", compress_level=3)
+    os.replace(tmp_path, path)
+    print(f"  > カード画像を作成しました: {path}")
+    return path
+
+
+if __name__ == '__main__':
+    from config_util import load_config
+    config = load_config()
+    templates = config.get('media_templates', {})
+    path = render_card('hellog', templates.get('hellog', {}),
+                       "#6000. 英語史ブログのカード画像をブラウザなしで描画するテスト",
+                       datetime.now(timezone.utc).isoformat(), config.get('card_settings'))
+    print(path)
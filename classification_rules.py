@@ -0,0 +1,99 @@
+"""
+共有フィード（heldio_rss.xml のように複数メディアが同じ URL を使うもの）の分類ルール。
+
+media_templates[*].x_post_template の filtering_rules / exclude_keywords から
+実行ごとに1回だけルールを組み立て、正規表現もそのときにコンパイルしておく。
+評価順は filtering_rules.priority の大きい順（同じなら config.json の順）。
+
+    engine = ClassificationEngine.from_config(config)
+    results = engine.classify_many(titles, ['heldio', 'helwa'])
+    results[0].media_id, results[0].rule   # → 'helwa', "include_regex '【英語史の輪'"
+"""
+import re
+from collections import namedtuple
+
+# media_id: 分類先（どれにも一致しなければ None）、rule: 決め手になったルールの説明
+ClassificationResult = namedtuple('ClassificationResult', ['media_id', 'rule'])
+
+
+class MediaRule:
+    """1つのメディアの分類ルール（コンパイル済み）"""
+
+    def __init__(self, media_id, order, filtering_rules=None, exclude_keywords=None):
+        rules = filtering_rules or {}
+        self.media_id = media_id
+        self.priority = rules.get('priority', 0)
+        self.order = order  # config.json での並び順（同じ priority のときに使う）
+        self.include = re.compile(rules['include_regex']) if rules.get('include_regex') else None
+        self.exclude = re.compile(rules['exclude_regex']) if rules.get('exclude_regex') else None
+        self.exclude_keywords = tuple(exclude_keywords or ())
+
+    def match(self, title):
+        """タイトルがこのメディアに分類されるなら決め手のルールの説明を、されなければ None を返す"""
+        if self.include and not self.include.search(title):
+            return None
+        if self.exclude and self.exclude.search(title):
+            return None
+        if self.include:
+            return f"include_regex '{self.include.pattern}'"
+        if self.exclude:
+            return f"exclude_regex '{self.exclude.pattern}' に不一致"
+        return "ルールなし（既定）"
+
+    def excluded_keyword(self, title):
+        """X投稿の除外キーワードがタイトルに含まれていれば、そのキーワードを返す"""
+        for keyword in self.exclude_keywords:
+            if keyword in title:
+                return keyword
+        return None
+
+
+class ClassificationEngine:
+    """media_templates 全体の分類ルール。fetch の実行ごとに1回作る"""
+
+    def __init__(self, rules):
+        self.rules = {rule.media_id: rule for rule in rules}
+        self._ordered_cache = {}
+
+    @classmethod
+    def from_config(cls, config):
+        rules = []
+        for order, (media_id, media_info) in enumerate(config.get('media_templates', {}).items()):
+            x_template = media_info.get('x_post_template', {})
+            rules.append(MediaRule(
+                media_id, order,
+                x_template.get('filtering_rules'),
+                x_template.get('exclude_keywords'),
+            ))
+        return cls(rules)
+
+    def _ordered(self, media_ids):
+        """候補メディアのルールを評価順に並べたもの（候補の組み合わせごとにキャッシュ）"""
+        key = tuple(media_ids)
+        if key not in self._ordered_cache:
+            candidates = [self.rules[m] for m in dict.fromkeys(media_ids) if m in self.rules]
+            candidates.sort(key=lambda rule: (-rule.priority, rule.order))
+            self._ordered_cache[key] = candidates
+        return self._ordered_cache[key]
+
+    def classify(self, title, media_ids):
+        """タイトルを候補メディアのうち最初に一致したものに分類する"""
+        return self.classify_many([title], media_ids)[0]
+
+    def classify_many(self, titles, media_ids):
+        """複数のタイトルをまとめて分類し、ClassificationResult のリストを返す"""
+        ordered = self._ordered(media_ids)
+        results = []
+        for title in titles:
+            for rule in ordered:
+                fired = rule.match(title)
+                if fired:
+                    results.append(ClassificationResult(rule.media_id, fired))
+                    break
+            else:
+                results.append(ClassificationResult(None, None))
+        return results
+
+    def excluded_keyword(self, media_id, title):
+        rule = self.rules.get(media_id)
+        return rule.excluded_keyword(title) if rule else None
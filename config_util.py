@@ -0,0 +1,231 @@
+"""
+config.json の読み込みをまとめたモジュール。各スクリプトの load_config() はここを呼ぶ。
+
+設定はプロセスごとに1回だけ解析・検証してキャッシュし、ファイルの更新日時 (mtime) と
+サイズが変わったときだけ読み直す。開いたままの manage-posts で何度 load_config() を
+呼んでも JSON の解析は繰り返さず、config.json を書き換えれば次の呼び出しで反映される。
+
+media_templates / x_post_template / scheduling / custom_commands / deploy_targets / site_output / site_build /
+site_archive は読み込み時に検証し、誤りがあれば ConfigError を送出する（投稿や撮影の途中ではなく起動時に失敗させる）。
+返す dict は全体で共有するため、呼び出し側で書き換えないこと。
+"""
+import os
+import re
+import json
+import string
+import threading
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_CONFIG_PATH = 'config.json'
+
+# x_post_template.template で使える置換フィールド（fetch_feeds._build_draft と合わせる）
+TEMPLATE_FIELDS = {'title', 'link'}
+IMAGE_MODES = {'auto', 'manual', 'card'}
+DEPLOY_BACKENDS = {'winscp', 'sftp'}
+SITE_OUTPUT_MODES = {'development', 'production'}
+
+_lock = threading.Lock()
+_cache = {}  # 絶対パス → ((mtime_ns, size), config)
+
+
+class ConfigError(ValueError):
+    """config.json の内容が不正"""
+
+    def __init__(self, path, problems):
+        self.path = path
+        self.problems = list(problems)
+        lines = "\n".join(f"  - {problem}" for problem in self.problems)
+        super().__init__(f"'{path}' の設定に誤りがあります ({len(self.problems)}件):\n{lines}")
+
+
+def _check_x_post_template(where, x_template, problems):
+    if not isinstance(x_template, dict):
+        problems.append(f"{where}: オブジェクトではありません")
+        return
+
+    if 'is_active' in x_template and not isinstance(x_template['is_active'], bool):
+        problems.append(f"{where}.is_active: true / false で指定してください")
+
+    template = x_template.get('template')
+    if template is not None:
+        if not isinstance(template, str):
+            problems.append(f"{where}.template: 文字列ではありません")
+        else:
+            try:
+                fields = {name for _, name, _, _ in string.Formatter().parse(template) if name is not None}
+            except ValueError as e:
+                problems.append(f"{where}.template: 書式が正しくありません ({e})")
+            else:
+                unknown = fields - TEMPLATE_FIELDS
+                if unknown:
+                    problems.append(f"{where}.template: 使えない置換フィールド {sorted(unknown)}"
+                                    f"（使えるのは {{title}} と {{link}}）")
+
+    rules = x_template.get('filtering_rules', {})
+    if not isinstance(rules, dict):
+        problems.append(f"{where}.filtering_rules: オブジェクトではありません")
+    else:
+        for key in ('include_regex', 'exclude_regex'):
+            if rules.get(key):
+                try:
+                    re.compile(rules[key])
+                except (re.error, TypeError) as e:
+                    problems.append(f"{where}.filtering_rules.{key}: 正規表現が不正です ({e})")
+        priority = rules.get('priority', 0)
+        if isinstance(priority, bool) or not isinstance(priority, int):
+            problems.append(f"{where}.filtering_rules.priority: 整数で指定してください")
+
+    keywords = x_template.get('exclude_keywords', [])
+    if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+        problems.append(f"{where}.exclude_keywords: 文字列のリストで指定してください")
+
+    image = x_template.get('image_settings', {})
+    if not isinstance(image, dict):
+        problems.append(f"{where}.image_settings: オブジェクトではありません")
+    elif image.get('attach_image'):
+        mode = image.get('mode')
+        if mode not in IMAGE_MODES:
+            problems.append(f"{where}.image_settings.mode: {sorted(IMAGE_MODES)} のいずれかを指定してください"
+                            f"（現在: {mode!r}）")
+        elif mode == 'manual' and not image.get('manual_path'):
+            problems.append(f"{where}.image_settings: mode が 'manual' のときは manual_path が必要です")
+
+
+def _check_custom_commands(commands, problems):
+    if not isinstance(commands, dict):
+        problems.append("custom_commands: オブジェクトではありません")
+        return
+    for name, node in commands.items():
+        where = f"custom_commands.{name}"
+        if not isinstance(node, dict):
+            problems.append(f"{where}: オブジェクトではありません")
+            continue
+        steps = node.get('steps')
+        if not isinstance(steps, list) or not steps:
+            problems.append(f"{where}.steps: 1つ以上のステップのリストが必要です")
+            continue
+        for i, step in enumerate(steps):
+            if not isinstance(step, dict):
+                problems.append(f"{where}.steps[{i}]: オブジェクトではありません")
+            elif 'ref' in step:
+                # 別のコマンドの steps を展開する（run_custom.flatten_steps）
+                if step['ref'] not in commands:
+                    problems.append(f"{where}.steps[{i}].ref: コマンド {step['ref']!r} がありません")
+            else:
+                # cmd は文字列のリストか、シェルに渡す文字列1つ（run_custom.run_step と同じ扱い）
+                cmd = step.get('cmd')
+                if isinstance(cmd, list):
+                    valid = bool(cmd) and all(isinstance(c, str) for c in cmd)
+                else:
+                    valid = isinstance(cmd, str) and bool(cmd.strip())
+                if not valid:
+                    problems.append(f"{where}.steps[{i}].cmd: 文字列のリストか文字列で指定してください")
+
+
+def _check_deploy_targets(targets, problems):
+    if not isinstance(targets, dict):
+        problems.append("deploy_targets: オブジェクトではありません")
+        return
+    for name, target in targets.items():
+        where = f"deploy_targets.{name}"
+        if not isinstance(target, dict):
+            problems.append(f"{where}: オブジェクトではありません")
+            continue
+        for key in ('local_dir', 'remote_dir', 'session'):
+            if key in target and not isinstance(target[key], str):
+                problems.append(f"{where}.{key}: 文字列で指定してください")
+        files = target.get('files')
+        if files is not None and (not isinstance(files, list) or not all(isinstance(f, str) for f in files)):
+            problems.append(f"{where}.files: 文字列（glob）のリストで指定してください")
+
+
+def validate_config(config):
+    """設定の誤りを説明する文字列のリストを返す（問題がなければ空）"""
+    if not isinstance(config, dict):
+        return ["最上位がオブジェクトではありません"]
+    problems = []
+
+    templates = config.get('media_templates', {})
+    if not isinstance(templates, dict):
+        problems.append("media_templates: オブジェクトではありません")
+    else:
+        for media_id, media_info in templates.items():
+            if not isinstance(media_info, dict):
+                problems.append(f"media_templates.{media_id}: オブジェクトではありません")
+            elif 'x_post_template' in media_info:
+                _check_x_post_template(f"media_templates.{media_id}.x_post_template",
+                                       media_info['x_post_template'], problems)
+
+    scheduling = config.get('scheduling', {})
+    if not isinstance(scheduling, dict):
+        problems.append("scheduling: オブジェクトではありません")
+    else:
+        for key in ('input_tz', 'preview_tz'):
+            if key in scheduling:
+                try:
+                    ZoneInfo(scheduling[key])
+                except (ZoneInfoNotFoundError, ValueError, TypeError):
+                    problems.append(f"scheduling.{key}: 不明なタイムゾーン {scheduling[key]!r}")
+
+    if 'custom_commands' in config:
+        _check_custom_commands(config['custom_commands'], problems)
+    if 'deploy_targets' in config:
+        _check_deploy_targets(config['deploy_targets'], problems)
+    backend = config.get('winscp_settings', {}).get('backend', 'winscp')
+    if backend not in DEPLOY_BACKENDS:
+        problems.append(f"winscp_settings.backend: {sorted(DEPLOY_BACKENDS)} のいずれかを指定してください（現在: {backend!r}）")
+    for key, value in config.get('site_build', {}).items():
+        if not isinstance(value, str):
+            problems.append(f"site_build.{key}: 文字列で指定してください")
+    archive = config.get('site_archive', {})
+    if 'tz' in archive:
+        try:
+            ZoneInfo(archive['tz'])
+        except (ZoneInfoNotFoundError, ValueError, TypeError):
+            problems.append(f"site_archive.tz: 不明なタイムゾーン {archive['tz']!r}")
+    site_mode = config.get('site_output', {}).get('mode', 'development')
+    if site_mode not in SITE_OUTPUT_MODES:
+        problems.append(f"site_output.mode: {sorted(SITE_OUTPUT_MODES)} のいずれかを指定してください（現在: {site_mode!r}）")
+    return problems
+
+
+def load_config(path=DEFAULT_CONFIG_PATH):
+    """
+    検証済みの設定を返す。前回からファイルが変わっていなければキャッシュをそのまま返す。
+    ファイルが無い・JSON が壊れている場合は FileNotFoundError / json.JSONDecodeError を、
+    内容が不正な場合は ConfigError を送出する。
+    """
+    abs_path = os.path.abspath(path)
+    st = os.stat(abs_path)
+    stamp = (st.st_mtime_ns, st.st_size)
+
+    with _lock:
+        cached = _cache.get(abs_path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        with open(abs_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        problems = validate_config(config)
+        if problems:
+            raise ConfigError(path, problems)
+        _cache[abs_path] = (stamp, config)
+        return config
+
+
+def clear_config_cache():
+    """キャッシュを捨てる（次の load_config() で必ず読み直す）"""
+    with _lock:
+        _cache.clear()
+
+
+if __name__ == '__main__':
+    # python config_util.py [パス]: 設定を検証して結果を表示する
+    import sys
+    target = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CONFIG_PATH
+    try:
+        load_config(target)
+    except (FileNotFoundError, json.JSONDecodeError, ConfigError) as e:
+        print(f"!!! エラー: {e}")
+        sys.exit(1)
+    print(f"'{target}' の設定に問題はありません。")
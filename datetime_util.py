@@ -0,0 +1,121 @@
+"""
+日時の解釈・正規化をまとめたモジュール。
+
+DB には日時を UTC の ISO8601 文字列で保存し（scheduled_at は '...Z'、
+published_date は '+00:00' の過去データもある）、範囲検索には同じ値を
+UNIX 秒にした整数カラム (content.published_epoch / posts.scheduled_epoch) を使う。
+文字列の解釈と ZoneInfo はキャッシュするため、同じ値を何度渡しても解析は1回で済む。
+"""
+import calendar
+from datetime import datetime, timezone, timedelta
+from email.utils import parsedate_to_datetime  # RFC822 等
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# 日付だけが入力されたときに補う時刻（入力タイムゾーンでの時）
+DEFAULT_DATE_ONLY_HOUR = 9
+
+_FALLBACK_FORMATS = ("%Y-%m-%dT%H:%M:%S%z",
+                     "%Y-%m-%dT%H:%M:%SZ",
+                     "%Y-%m-%dT%H:%M:%S",
+                     "%Y-%m-%d")
+
+
+@lru_cache(maxsize=None)
+def get_zone(tz_name):
+    """ZoneInfo を名前ごとに1回だけ作る"""
+    return ZoneInfo(tz_name)
+
+
+def _as_utc(dt):
+    # tz が無い場合は UTC とみなす（過去データ救済）
+    return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+@lru_cache(maxsize=4096)
+def parse_utcish(s):
+    """
+    ISO8601（Z / オフセット付き / なし）や RFC822 の文字列を UTC の datetime にする。
+    tz の無い値は UTC とみなす。解釈できなければ None。
+    """
+    if not s:
+        return None
+    s = s.strip()
+
+    # 1) ISO8601（DB に保存している形式。'Z' は古い Python でも読めるよう置き換える）
+    try:
+        return _as_utc(datetime.fromisoformat(s.replace("Z", "+00:00")))
+    except ValueError:
+        pass
+
+    # 2) RFC822（例: Wed, 18 Oct 2023 12:34:56 GMT）
+    try:
+        return _as_utc(parsedate_to_datetime(s))
+    except (TypeError, ValueError, IndexError):
+        pass
+
+    # 3) その他の代表的な形式
+    for fmt in _FALLBACK_FORMATS:
+        try:
+            return _as_utc(datetime.strptime(s, fmt))
+        except ValueError:
+            continue
+    return None
+
+
+def struct_time_to_utc(st):
+    """feedparser の *_parsed（UTC の struct_time）を UTC の datetime にする"""
+    # time.mktime はローカル時刻として解釈してしまうため calendar.timegm を使う
+    return datetime.fromtimestamp(calendar.timegm(st), tz=timezone.utc)
+
+
+def parse_local_datetime(s, tz_name):
+    """'YYYY-MM-DD [HH:MM[:SS]]' を tz_name の tz-aware datetime にする"""
+    s = s.strip().replace("T", " ")
+    fmts = ["%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]
+    tz = get_zone(tz_name)
+    last_err = None
+    for fmt in fmts:
+        try:
+            naive = datetime.strptime(s, fmt)
+            # 日付のみのときは 09:00 を既定に
+            if fmt == "%Y-%m-%d":
+                naive = naive.replace(hour=DEFAULT_DATE_ONLY_HOUR, minute=0, second=0)
+            return naive.replace(tzinfo=tz)
+        except ValueError as e:
+            last_err = e
+    raise ValueError(f"日時の解釈に失敗: '{s}' (tz={tz_name}) / {last_err}")
+
+
+def isoformat_utc(dt):
+    """UTC の ISO8601（…Z）で秒精度の文字列にする（DB の scheduled_at と同じ形）"""
+    return _as_utc(dt).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def now_utc():
+    return datetime.now(timezone.utc)
+
+
+def now_utc_iso():
+    return isoformat_utc(now_utc())
+
+
+def to_epoch(value):
+    """datetime / 日時文字列を UNIX 秒 (int) にする。解釈できなければ None"""
+    if value is None:
+        return None
+    dt = value if isinstance(value, datetime) else parse_utcish(value)
+    return int(_as_utc(dt).timestamp()) if dt else None
+
+
+def epoch_days_ago(days):
+    """現在から days 日前の UNIX 秒"""
+    return to_epoch(now_utc() - timedelta(days=days))
+
+
+def pretty_in_tz(iso_utc, tz_name):
+    """UTC 文字列を任意TZの見やすい表記にする"""
+    dt = parse_utcish(iso_utc)
+    if not dt:
+        return "-"
+    return dt.astimezone(get_zone(tz_name)).strftime("%Y-%m-%d %H:%M (%Z)")
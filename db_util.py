@@ -0,0 +1,47 @@
+"""
+SQLite への接続をまとめたモジュール。すべてのサブコマンドはここから接続を得る。
+
+cron から動く post-now / update-web と、開いたままの manage-posts が同じ content.db を
+使っても "database is locked" にならないよう、次の設定で接続する。
+  - journal_mode=WAL      : 読み取りは書き込みを待たず、書き込みも読み取りを待たない
+  - synchronous=NORMAL    : WAL では NORMAL でも破損しない（電源断時に直前の commit が失われうるだけ）
+  - busy_timeout          : 別プロセスが書き込み中ならエラーにせず待つ
+  - mmap_size / cache_size: 読み取りをメモリマップとページキャッシュで速くする
+  - cached_statements     : 同じ SQL 文はコンパイル済みの文を使い回す
+"""
+import sqlite3
+
+from config_util import load_config
+
+# config.json の database_settings で上書きできる
+DEFAULT_DATABASE_SETTINGS = {
+    "busy_timeout_ms": 10000,
+    "mmap_size_mb": 256,
+    "cache_size_mb": 16,
+    "cached_statements": 256,
+}
+
+def connect(db_path=None, config=None):
+    """
+    設定済みの接続を返す（row_factory は sqlite3.Row）。
+    db_path を省略すると config.json の database_path を使う。
+    """
+    if config is None:
+        config = load_config()
+    if db_path is None:
+        db_path = config.get('database_path', 'content.db')
+    settings = dict(DEFAULT_DATABASE_SETTINGS)
+    settings.update(config.get('database_settings', {}))
+
+    conn = sqlite3.connect(
+        db_path,
+        timeout=settings["busy_timeout_ms"] / 1000,
+        cached_statements=settings["cached_statements"],
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {int(settings['busy_timeout_ms'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(settings['mmap_size_mb']) * 1024 * 1024}")
+    conn.execute(f"PRAGMA cache_size = {-int(settings['cache_size_mb']) * 1024}")  # 負の値は KiB 単位
+    return conn
@@ -0,0 +1,479 @@
+"""
+ウェブサーバーへの配信（差分アップロード）。
+
+配信先ごとに、最後にアップロードしたファイルの内容のハッシュ (SHA-256) を
+deploy_manifest テーブルに記録しておき、前回から変わったファイルだけを送る。
+変わったファイルが無ければ接続自体を開かない。
+mtime とサイズが前回と同じファイルはハッシュも計算し直さない。
+
+送信方法は winscp_settings.backend で選ぶ。
+  - "winscp"（既定）: WinSCP.exe に一時スクリプトを渡して実行する（Windows のみ）
+  - "sftp"          : paramiko で直接 SFTP 接続する（Linux でも動く）。1回の実行で開くセッションは
+                      1つだけで、その上に複数のチャネルを開いて並列に送り、一時名で送ってから
+                      rename で置き換える（閲覧者が書きかけのファイルを受け取らない）
+
+配信先は config.json の deploy_targets で定義する（"helhub" は winscp_settings から自動で作られる）。
+    "hellog": {
+        "local_dir": "C:/.../hellog",
+        "remote_dir": "/home/.../public_html/hellog/",
+        "files": ["index.html", "cl.rdf", "????-??-??*.html"],   // local_dir からの glob
+        "session": "keioacjp"   // WinSCP に保存済みのサイト名。省略時と backend "sftp" では .env の接続情報を使う
+    }
+
+    python helhub.py deploy hellog               # 変わったファイルだけアップロード
+    python helhub.py deploy hellog --dry-run     # アップロードするファイルを表示するだけ
+    python helhub.py deploy hellog --mark-deployed  # 今の状態を配信済みとして記録する（初回用）
+    python helhub.py deploy helhub hellog        # 複数の配信先を1つの SFTP セッションで送る
+"""
+import os
+import glob
+import hashlib
+import posixpath
+import threading
+import subprocess
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from setup_database import create_tables
+from db_util import connect
+from config_util import load_config
+import generate_data_js
+import build_site
+
+# index.html などウェブサイト本体の配信先
+SITE_TARGET = 'helhub'
+# index.html / site.css（と production の圧縮済みファイル）は build_site.output_files() から、
+# 過去の記事 (archive/) は generate_data_js.archive_files() から加える。
+# 配信するサイトは hel-data.js を読まないので送らない（テンプレートを直接開いて確認するときだけ使う）
+SITE_FILES = ['README.md']
+
+# config.json の winscp_settings で上書きできる（backend が "sftp" のときに使う）
+DEFAULT_SFTP_SETTINGS = {
+    "port": 22,
+    "parallel_transfers": 4,   # 同時に開くチャネル（並列に送るファイル）の数
+    "timeout_sec": 30,
+    "private_key_path": None,  # 省略時は .env の WINSCP_PASSWORD でログインする
+    "known_hosts_path": None,  # 指定するとホスト鍵を検証する（省略時は WinSCP の -hostkey="*" と同じく受け入れる）
+}
+
+# path: local_dir からの相対パス（/ 区切り）、abs_path: 実際のパス
+LocalFile = namedtuple('LocalFile', ['path', 'abs_path', 'byte_size', 'mtime_ns', 'sha256'])
+
+
+def load_deploy_targets(config):
+    """配信先の定義（名前 → dict）。"helhub" は winscp_settings.remote_directory を使う"""
+    targets = {
+        SITE_TARGET: {
+            "local_dir": ".",
+            "remote_dir": config.get('winscp_settings', {}).get('remote_directory'),
+            "files": build_site.output_files(config) + generate_data_js.archive_files() + SITE_FILES,
+        }
+    }
+    for name, target in config.get('deploy_targets', {}).items():
+        merged = dict(targets.get(name, {}))
+        merged.update(target)
+        targets[name] = merged
+    return targets
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def collect_files(target):
+    """files の glob に一致するローカルのファイルを LocalFile（sha256 は未計算）のリストで返す"""
+    base = target["local_dir"]
+    found = {}
+    for pattern in target.get("files", []):
+        matches = sorted(glob.glob(os.path.join(base, pattern)))
+        if not matches and not glob.has_magic(pattern):
+            print(f"警告: アップロード対象のファイル '{pattern}' が見つかりません。")
+        for abs_path in matches:
+            if not os.path.isfile(abs_path):
+                continue
+            rel_path = os.path.relpath(abs_path, base).replace(os.sep, '/')
+            if rel_path in found:
+                continue
+            st = os.stat(abs_path)
+            found[rel_path] = LocalFile(rel_path, abs_path, st.st_size, st.st_mtime_ns, None)
+    return list(found.values())
+
+
+class DeployManifest:
+    """deploy_manifest テーブル（配信先ごとの、配信済みファイルのハッシュ）"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        create_tables(conn)
+
+    def changed_files(self, target_name, remote_dir, files, force=False):
+        """
+        前回の配信から内容が変わったファイルを sha256 付きで返す。
+        内容は同じで mtime だけ変わったファイルは、次回ハッシュを計算しないよう記録を更新する。
+        """
+        deployed = {
+            row['path']: row for row in self.conn.execute(
+                "SELECT path, remote_dir, sha256, byte_size, mtime_ns FROM deploy_manifest WHERE target = ?",
+                (target_name,)
+            )
+        }
+        changed, touched = [], []
+        for file in files:
+            row = deployed.get(file.path)
+            if row is not None and row['remote_dir'] != remote_dir:
+                row = None  # 配信先のディレクトリが変わったら送り直す
+            if not force and row is not None \
+                    and row['byte_size'] == file.byte_size and row['mtime_ns'] == file.mtime_ns:
+                continue
+            file = file._replace(sha256=_sha256(file.abs_path))
+            if not force and row is not None and row['sha256'] == file.sha256:
+                touched.append(file)
+            else:
+                changed.append(file)
+        if touched:
+            self.record(target_name, remote_dir, touched)
+        return changed
+
+    def record(self, target_name, remote_dir, files):
+        """files を配信済みとして記録する"""
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO deploy_manifest (target, path, remote_dir, sha256, byte_size, mtime_ns, deployed_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(target, path) DO UPDATE SET
+                    remote_dir = excluded.remote_dir,
+                    sha256 = excluded.sha256,
+                    byte_size = excluded.byte_size,
+                    mtime_ns = excluded.mtime_ns,
+                    deployed_at = excluded.deployed_at
+            """, [(target_name, f.path, remote_dir, f.sha256, f.byte_size, f.mtime_ns) for f in files])
+
+
+def _remote_dir_for(remote_dir, rel_path):
+    """ファイルを置くリモートのディレクトリ（サブディレクトリのファイルはその下）"""
+    subdir = posixpath.dirname(rel_path)
+    remote_dir = remote_dir.rstrip('/') + '/'
+    return remote_dir + subdir + '/' if subdir else remote_dir
+
+
+def upload_with_winscp(config, target, files):
+    """
+    WinSCPを使用して files をアップロードする（クリーンセッション版）。
+    アップロードできたら True、設定不足でスキップしたら None を返す（失敗時は例外）。
+    """
+    settings = config.get('winscp_settings', {})
+
+    winscp_path = settings.get('winscp_executable_path')
+    if not winscp_path or not os.path.exists(winscp_path):
+        print(f"エラー: config.jsonに指定されたWinSCPの実行ファイルが見つかりません (パス: {winscp_path})。")
+        print("アップロードをスキップします。")
+        return None
+
+    remote_dir = target.get('remote_dir')
+    session = target.get('session')
+    if session:
+        # WinSCP に保存済みのセッション（サイト）名で接続する
+        open_command = f'open {session}'
+        credentials_ok = bool(remote_dir)
+    else:
+        protocol = settings.get('protocol', 'sftp')
+        host = os.getenv('WINSCP_HOST_NAME')
+        user = os.getenv('WINSCP_USER_NAME')
+        password = os.getenv('WINSCP_PASSWORD')
+        open_command = f'open {protocol}://{user}:{password}@{host}/ -hostkey="*"'
+        credentials_ok = all([host, user, password, remote_dir])
+
+    if not credentials_ok:
+        print("エラー: WinSCP設定（ホスト名, ユーザー名, パスワード, リモートディレクトリ）が不足しています。")
+        print(".envファイルとconfig.jsonの設定を確認してください。")
+        print("アップロードをスキップします。")
+        return None
+
+    script_content = []
+    script_content.append('option batch abort')
+    script_content.append('option confirm off')
+    script_content.append(f'lcd "{os.path.abspath(target["local_dir"])}"')
+    script_content.append(open_command)
+    for file in files:
+        script_content.append(f'put "{file.path}" "{_remote_dir_for(remote_dir, file.path)}"')
+    script_content.append('exit')
+
+    temp_script_path = ''
+    try:
+        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt', encoding='utf-8') as temp_script:
+            temp_script.write('\n'.join(script_content))
+            temp_script_path = temp_script.name
+
+        print("WinSCPコマンドを実行します...")
+
+        # /ini=nul で保存済み設定を無視する（session を使う場合は保存済みのサイト定義が必要）
+        command = [winscp_path, f"/script={temp_script_path}", "/log=winscp.log"]
+        if not session:
+            command.insert(1, "/ini=nul")
+
+        result = subprocess.run(
+            command,
+            check=True,
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            errors='replace'
+        )
+
+        print("--- WinSCP ログ ---")
+        print(result.stdout)
+        if result.stderr:
+            print("--- WinSCP エラーログ ---")
+            print(result.stderr)
+        print("--- ファイルアップロード完了 ---")
+        return True
+
+    except subprocess.CalledProcessError as e:
+        print("エラー: WinSCPでのアップロードに失敗しました。")
+        print("--- WinSCP ログ (エラー) ---")
+        print(e.stdout)
+        print(e.stderr)
+        print("---")
+        print("考えられる原因:")
+        print("1. .envファイルのホスト名, ユーザー名, パスワードが間違っている。")
+        print("2. サーバー側のファイアウォールで接続が拒否されている。")
+        print("3. remote_directoryのパスが間違っている、または書き込み権限がない。")
+
+        if os.path.exists('winscp.log'):
+            print("\n詳細な接続ログが winscp.log ファイルに出力されています。")
+
+        raise
+    finally:
+        if os.path.exists(temp_script_path):
+            os.remove(temp_script_path)
+
+
+class SFTPUploader:
+    """
+    paramiko による SFTP アップロード。1つの認証済みセッションを使い回し、
+    スレッドごとに SFTP チャネルを開いて並列に送る。
+    """
+
+    def __init__(self, host, user, password=None, settings=None):
+        try:
+            import paramiko
+        except ImportError:
+            raise RuntimeError("winscp_settings.backend が 'sftp' ですが、paramiko がインストールされていません (pip install paramiko)。")
+        merged = dict(DEFAULT_SFTP_SETTINGS)
+        merged.update({k: v for k, v in (settings or {}).items() if k in DEFAULT_SFTP_SETTINGS})
+        self.workers = max(1, int(merged["parallel_transfers"]))
+
+        self.client = paramiko.SSHClient()
+        if merged["known_hosts_path"]:
+            self.client.load_host_keys(merged["known_hosts_path"])
+            self.client.set_missing_host_key_policy(paramiko.RejectPolicy())
+        else:
+            self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        key_path = merged["private_key_path"]
+        self.client.connect(
+            host, port=int(merged["port"]), username=user,
+            password=None if key_path else password, key_filename=key_path,
+            timeout=merged["timeout_sec"], allow_agent=False, look_for_keys=False,
+        )
+        self.transport = self.client.get_transport()
+        self._local = threading.local()
+        self._channels = []
+        self._lock = threading.Lock()
+        self._known_dirs = set()
+
+    def _sftp(self):
+        """このスレッド用の SFTP チャネル（同じセッションの上に開く）"""
+        sftp = getattr(self._local, 'sftp', None)
+        if sftp is None:
+            sftp = self.transport.open_sftp_client()
+            self._local.sftp = sftp
+            with self._lock:
+                self._channels.append(sftp)
+        return sftp
+
+    def _ensure_dir(self, remote_dir):
+        """リモートのディレクトリが無ければ親から順に作る"""
+        remote_dir = remote_dir.rstrip('/') or '/'
+        if remote_dir in self._known_dirs or remote_dir == '/':
+            return
+        sftp = self._sftp()
+        try:
+            sftp.stat(remote_dir)
+        except IOError:
+            self._ensure_dir(posixpath.dirname(remote_dir))
+            sftp.mkdir(remote_dir)
+        self._known_dirs.add(remote_dir)
+
+    def _put(self, local_path, remote_path):
+        """一時名で送ってから置き換える"""
+        sftp = self._sftp()
+        directory, name = posixpath.split(remote_path)
+        temp_path = posixpath.join(directory, f".{name}.uploading")
+        sftp.put(local_path, temp_path, confirm=True)
+        try:
+            sftp.posix_rename(temp_path, remote_path)
+        except IOError:
+            # posix-rename@openssh.com に対応していないサーバーでは、消してから rename する
+            try:
+                sftp.remove(remote_path)
+            except IOError:
+                pass
+            sftp.rename(temp_path, remote_path)
+
+    def upload(self, local_dir, remote_dir, files):
+        """files を並列に送る。1件でも失敗したら、ほかの転送を終えてから例外を送出する"""
+        jobs = [(os.path.join(local_dir, file.path), _remote_dir_for(remote_dir, file.path) + posixpath.basename(file.path))
+                for file in files]
+        for directory in sorted({posixpath.dirname(remote_path) for _, remote_path in jobs}):
+            self._ensure_dir(directory)
+
+        def put(job):
+            local_path, remote_path = job
+            self._put(local_path, remote_path)
+            print(f"  > 送信しました: {remote_path}", flush=True)
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(jobs))) as executor:
+            futures = [(job, executor.submit(put, job)) for job in jobs]
+            for (local_path, remote_path), future in futures:
+                try:
+                    future.result()
+                except (IOError, OSError) as e:
+                    errors.append(f"{remote_path}: {e}")
+        if errors:
+            raise IOError("SFTP でのアップロードに失敗したファイルがあります:\n" + "\n".join(errors))
+
+    def close(self):
+        for sftp in self._channels:
+            sftp.close()
+        self.client.close()
+
+
+class _SFTPSession:
+    """SFTPUploader を初めて必要になったときに1回だけ開く（何も送らなければ接続しない）"""
+
+    def __init__(self, config):
+        self.config = config
+        self.uploader = None
+
+    def get(self):
+        if self.uploader is None:
+            settings = self.config.get('winscp_settings', {})
+            host = os.getenv('WINSCP_HOST_NAME')
+            user = os.getenv('WINSCP_USER_NAME')
+            password = os.getenv('WINSCP_PASSWORD')
+            if not host or not user or not (password or settings.get('private_key_path')):
+                print("エラー: SFTP の接続情報（ホスト名, ユーザー名, パスワードまたは秘密鍵）が不足しています。")
+                print(".envファイルとconfig.jsonの設定を確認してください。")
+                return None
+            print(f"SFTP で {host} に接続します...")
+            self.uploader = SFTPUploader(host, user, password, settings)
+        return self.uploader
+
+    def close(self):
+        if self.uploader is not None:
+            self.uploader.close()
+            self.uploader = None
+
+
+def upload_with_sftp(session, target, files):
+    """
+    SFTP で files をアップロードする。
+    アップロードできたら True、設定不足でスキップしたら None を返す（失敗時は例外）。
+    """
+    if not target.get('remote_dir'):
+        print("エラー: 配信先の remote_dir（リモートディレクトリ）が設定されていません。アップロードをスキップします。")
+        return None
+    uploader = session.get()
+    if uploader is None:
+        print("アップロードをスキップします。")
+        return None
+    uploader.upload(target["local_dir"], target["remote_dir"], files)
+    print("--- ファイルアップロード完了 ---")
+    return True
+
+
+def deploy_target(name=SITE_TARGET, config=None, conn=None, force=False, dry_run=False, mark_deployed=False,
+                  sftp_session=None):
+    """
+    配信先 name のうち、前回の配信から変わったファイルだけをアップロードする。
+    force=True なら全ファイルを送る。mark_deployed=True ならアップロードせずに配信済みとして記録する。
+    アップロードした（または送るものが無かった）なら True、スキップしたら None を返す（失敗時は例外）。
+    sftp_session を渡すと、SFTP の接続をほかの配信先と共有する（deploy_targets を参照）。
+    """
+    if config is None:
+        config = load_config()
+    if sftp_session is None and config.get('winscp_settings', {}).get('backend') == 'sftp':
+        sftp_session = _SFTPSession(config)
+        owns_session = True
+    else:
+        owns_session = False
+    targets = load_deploy_targets(config)
+    target = targets.get(name)
+    if target is None:
+        print(f"エラー: 配信先 '{name}' が config.json の deploy_targets にありません (定義済み: {', '.join(targets)})。")
+        return None
+
+    print(f"\n--- 配信先 '{name}' のアップロードを開始... ---")
+    owns_conn = conn is None
+    if owns_conn:
+        conn = connect(config=config)
+    try:
+        manifest = DeployManifest(conn)
+        remote_dir = target.get('remote_dir') or ''
+        files = collect_files(target)
+        changed = manifest.changed_files(name, remote_dir, files, force=force)
+
+        if not changed:
+            print(f"{len(files)}件のファイルはどれも配信済みの内容と同じです。アップロードを省略します。")
+            return True
+        print(f"{len(files)}件中、{len(changed)}件のファイルが変更されています:")
+        for file in changed:
+            print(f"  > {file.path} ({file.byte_size / 1024:.1f} KB)")
+
+        if dry_run:
+            print("--dry-run: アップロードは行いません。")
+            return None
+        if mark_deployed:
+            manifest.record(name, remote_dir, changed)
+            print("アップロードせずに、配信済みとして記録しました。")
+            return True
+
+        if sftp_session is not None:
+            uploaded = upload_with_sftp(sftp_session, target, changed)
+        else:
+            uploaded = upload_with_winscp(config, target, changed)
+        if uploaded:
+            manifest.record(name, remote_dir, changed)
+        return uploaded
+    finally:
+        if owns_session:
+            sftp_session.close()
+        if owns_conn:
+            conn.close()
+
+
+def deploy_targets(names, config=None, force=False, dry_run=False, mark_deployed=False):
+    """
+    複数の配信先を順に配信する。DB 接続と（backend が "sftp" なら）SFTP セッションは共有する。
+    すべて成功（または送るものが無かった）なら True を返す。
+    """
+    if config is None:
+        config = load_config()
+    sftp_session = _SFTPSession(config) if config.get('winscp_settings', {}).get('backend') == 'sftp' else None
+    conn = connect(config=config)
+    results = []
+    try:
+        for name in names:
+            results.append(deploy_target(name, config=config, conn=conn, force=force, dry_run=dry_run,
+                                         mark_deployed=mark_deployed, sftp_session=sftp_session))
+    finally:
+        if sftp_session is not None:
+            sftp_session.close()
+        conn.close()
+    return all(results)
@@ -0,0 +1,98 @@
+"""
+RSS 2.0 / RSS 1.0 (RDF) / Atom を逐次的に解析するストリーミングパーサー。
+
+feedparser は文書全体を読み込んでからエントリーを返すため、全アーカイブを
+含む heldio_rss.xml のような大きなフィードではメモリと時間が件数に比例して増える。
+ここでは xml.etree.ElementTree.iterparse でエントリーを1件ずつ取り出し、
+呼び出し側が走査をやめた時点でそれ以降の読み込みも止まるようにする
+（古い順に並んだフィードだけは、fetch_feeds が最後まで読んでから並べ替える）。
+
+yield する dict は fetch_feeds が使うキー (id, link, title, published,
+updated, dc_date) だけを持ち、feedparser のエントリーと同じように .get() で扱える。
+"""
+import xml.etree.ElementTree as ET
+
+RDF_NS = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+RSS1_NS = "http://purl.org/rss/1.0/"
+ATOM_NS = "http://www.w3.org/2005/Atom"
+DC_NS = "http://purl.org/dc/elements/1.1/"
+
+# エントリーを表す要素のローカル名（RSS 2.0 / RSS 1.0 は item、Atom は entry）
+_ENTRY_TAGS = {"item", "entry"}
+
+# (名前空間, ローカル名) → 返す dict のキー
+# itunes:title や media:title などの拡張要素は拾わない
+_TEXT_FIELDS = {
+    ("", "guid"): "id",               # RSS 2.0
+    (ATOM_NS, "id"): "id",
+    ("", "title"): "title",
+    (RSS1_NS, "title"): "title",
+    (ATOM_NS, "title"): "title",
+    ("", "pubDate"): "published",     # RSS 2.0
+    (ATOM_NS, "published"): "published",
+    (ATOM_NS, "updated"): "updated",
+    (DC_NS, "date"): "dc_date",       # RSS 1.0 など
+}
+_LINK_TAGS = {("", "link"), (RSS1_NS, "link"), (ATOM_NS, "link")}
+
+
+def _split_tag(tag):
+    """'{namespace}name' 形式のタグを (namespace, name) に分ける"""
+    if tag.startswith("{"):
+        ns, name = tag[1:].split("}", 1)
+        return ns, name
+    return "", tag
+
+
+def _entry_from_element(elem):
+    """item / entry 要素から fetch_feeds 用の dict を組み立てる"""
+    entry = {}
+
+    # RSS 1.0 は item の rdf:about がそのまま ID（feedparser と同じ扱い）
+    about = elem.get(f"{{{RDF_NS}}}about")
+    if about:
+        entry["id"] = about.strip()
+
+    for child in elem:
+        tag = _split_tag(child.tag)
+        if tag in _LINK_TAGS:
+            # Atom は <link rel="alternate" href="..."/>、RSS は本文に URL
+            href = child.get("href")
+            if href:
+                if child.get("rel", "alternate") == "alternate" and "link" not in entry:
+                    entry["link"] = href.strip()
+            elif child.text and "link" not in entry:
+                entry["link"] = child.text.strip()
+            continue
+
+        key = _TEXT_FIELDS.get(tag)
+        if key and key not in entry and child.text:
+            entry[key] = child.text.strip()
+
+    return entry
+
+
+def iter_feed_entries(stream):
+    """
+    ファイルライクオブジェクトからフィードを逐次解析し、エントリーを1件ずつ yield する。
+    処理済みのエントリーはその都度親要素から外すため、メモリ使用量はフィードの長さに依存しない。
+    XML が壊れている場合は xml.etree.ElementTree.ParseError を送出する。
+    """
+    open_elements = []  # 開いている要素のスタック（親の特定に使う）
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            open_elements.append(elem)
+            continue
+
+        open_elements.pop()
+        if _split_tag(elem.tag)[1] not in _ENTRY_TAGS:
+            continue
+        if any(_split_tag(e.tag)[1] in _ENTRY_TAGS for e in open_elements):
+            continue  # 入れ子の entry（まれ）は外側でまとめて扱う
+
+        yield _entry_from_element(elem)
+
+        # 解析済みのエントリーを木から外してメモリを解放する
+        if open_elements:
+            open_elements[-1].remove(elem)
+        elem.clear()
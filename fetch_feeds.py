@@ -1,96 +1,28 @@
 import sqlite3
-import json
 import feedparser
-import re
-from datetime import datetime, timezone, timedelta
-from time import mktime
-from screenshot_util import take_screenshot
+import requests
+import hashlib
+import itertools
+import time
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+from setup_database import create_tables
+from screenshot_queue import enqueue_screenshot
+from card_renderer import render_card
+from classification_rules import ClassificationEngine
+from feed_stream import iter_feed_entries
+from datetime_util import parse_utcish, struct_time_to_utc, isoformat_utc, now_utc
+from db_util import connect
+from config_util import load_config
 
-# 追加: 文字列日付のパース用
-from email.utils import parsedate_to_datetime  # RFC822 等
-
-def load_config():
-    """設定ファイルを読み込む"""
-    with open('config.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
 
 def get_db_connection():
-    config = load_config()
-    db_path = config.get('database_path', 'content.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def _entry_matches_classification_rules(entry_title, media_id, config):
-    """
-    エントリーのタイトルが、特定のメディアIDの分類ルールに一致するかを判断する。
-    """
-    media_info = config.get('media_templates', {}).get(media_id, {})
-    x_template_settings = media_info.get('x_post_template', {})
-    rules = x_template_settings.get('filtering_rules', {})
-    
-    if rules.get('include_regex'):
-        if not re.search(rules['include_regex'], entry_title):
-            return False
-            
-    if rules.get('exclude_regex'):
-        if re.search(rules['exclude_regex'], entry_title):
-            return False
-            
-    return True
-
-def _classify_entry_media_id_from_shared_feed(entry_title, config, media_ids_sharing_feed):
-    """
-    共有フィードのエントリーを分類する。
-    helwa のルールを最優先で評価する。
-    """
-    # 1. 最優先ルール: helwa の include_regex に一致するか？
-    if 'helwa' in media_ids_sharing_feed:
-        if _entry_matches_classification_rules(entry_title, 'helwa', config):
-            return 'helwa'
-    
-    # 2. 次の優先ルール: heldio のルールに一致するか？
-    if 'heldio' in media_ids_sharing_feed:
-        if _entry_matches_classification_rules(entry_title, 'heldio', config):
-            return 'heldio'
-    
-    # 3. その他のメディアのルールをチェック (config.jsonの順)
-    for media_id_candidate in media_ids_sharing_feed:
-        if media_id_candidate not in ['helwa', 'heldio']:
-            if _entry_matches_classification_rules(entry_title, media_id_candidate, config):
-                return media_id_candidate
-    
-    return None
+    return connect()
 
 # ===== ここから日付処理の強化（追加） =====
 
-def _parse_date_str(s: str):
-    """RFC822 / ISO8601 を受け、UTC の datetime にして返す（失敗時は None）。"""
-    if not s:
-        return None
-    s = s.strip()
-
-    # 1) RFC822（例: Wed, 18 Oct 2023 12:34:56 GMT）
-    try:
-        dt = parsedate_to_datetime(s)
-        # tz が無い場合は UTC とみなす
-        return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
-    except Exception:
-        pass
-
-    # 2) 代表的な ISO8601
-    for fmt in ("%Y-%m-%dT%H:%M:%S%z",
-                "%Y-%m-%dT%H:%M:%SZ",
-                "%Y-%m-%dT%H:%M:%S",
-                "%Y-%m-%d"):
-        try:
-            dt = datetime.strptime(s, fmt)
-            return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
-        except Exception:
-            continue
-
-    return None
-
 def _choose_entry_datetime_utc(entry):
     """
     エントリーの公開日時を決定して UTC datetime を返す。
@@ -103,29 +35,443 @@ def _choose_entry_datetime_utc(entry):
       6) issued / created（保険）
       7) なければ現在UTC
     """
+    return _entry_datetime_utc(entry) or now_utc()
+
+def _entry_datetime_utc(entry):
+    """_choose_entry_datetime_utc の 1)〜6)。日付が無ければ None を返す"""
     # struct_time 系（feedparserが既にパース）
     if getattr(entry, 'published_parsed', None):
-        return datetime.fromtimestamp(mktime(entry.published_parsed), tz=timezone.utc)
+        return struct_time_to_utc(entry.published_parsed)
     if getattr(entry, 'updated_parsed', None):
-        return datetime.fromtimestamp(mktime(entry.updated_parsed), tz=timezone.utc)
+        return struct_time_to_utc(entry.updated_parsed)
 
     # 文字列系（順に試す）
     for key in ("published", "updated", "dc_date", "issued", "created"):
-        dt = _parse_date_str(entry.get(key))
+        dt = parse_utcish(entry.get(key))
         if dt:
             return dt
-
-    return datetime.now(timezone.utc)
+    return None
 
 # ===== ここまで追加 =====
 
-def isoformat_utc(dt):
-    return dt.astimezone(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00","Z")
+# ===== フィードの並列ダウンロード（条件付きGET対応） =====
+
+FEED_USER_AGENT = "HELHub-FeedFetcher/1.0 (+https://user.keio.ac.jp/~rhotta/helhub/)"
+
+# ワーカーからの取得結果。
+# body は全文取得 (feedparser 用) のときの bytes、
+# entries / newest_entry はストリーミング解析のときに high-water mark までで打ち切ったエントリー。
+FeedResponse = namedtuple('FeedResponse', ['status', 'body', 'headers', 'entries', 'newest_entry'])
+
+def _request_headers(validators):
+    """前回の ETag / Last-Modified があれば条件付きGET用のヘッダを付ける"""
+    headers = {'User-Agent': FEED_USER_AGENT}
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+# 本文を受信するときの1回の読み込みの大きさ（この単位で期限を確かめる）
+_READ_CHUNK_SIZE = 64 * 1024
+
+def _remaining(deadline):
+    """期限 (time.monotonic() の値) までの残り秒数を返す。過ぎていれば TimeoutError を送出する"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("期限までに受信が終わりませんでした")
+    return remaining
+
+class _DeadlineReader:
+    """
+    response.raw を包み、読むたびに期限を確かめる。
+    requests の timeout はソケットの1回の読み込みの待ち時間しか制限しないため、
+    少しずつ送ってくるサーバーでも受信全体が期限を超えないようにする。
+    read1 (届いている分だけ返す) があればそれを使い、バッファが埋まるまで待たない。
+    """
+    def __init__(self, raw, deadline):
+        raw.decode_content = True  # gzip 等を透過的に展開
+        self._read = getattr(raw, 'read1', raw.read)
+        self._deadline = deadline
+
+    def read(self, size=-1):
+        _remaining(self._deadline)
+        return self._read(size if size and size > 0 else _READ_CHUNK_SIZE)
+
+def _get(feed_url, deadline, validators):
+    return requests.get(feed_url, timeout=_remaining(deadline), headers=_request_headers(validators), stream=True)
+
+def _fetch_feed_body(feed_url, deadline, validators=None, high_water=None):
+    """
+    1つのフィードを全文ダウンロードして FeedResponse を返す（feedparser 用）。
+    304 Not Modified のときは本文を None として返す。期限を過ぎたら TimeoutError を送出する。
+    ワーカースレッドから呼ばれるため、DB や config には触らない。
+    """
+    response = _get(feed_url, deadline, validators)
+    try:
+        if response.status_code == 304:
+            return FeedResponse(304, None, response.headers, None, None)
+        response.raise_for_status()
+        reader = _DeadlineReader(response.raw, deadline)
+        chunks = []
+        for chunk in iter(reader.read, b''):
+            chunks.append(chunk)
+        return FeedResponse(response.status_code, b''.join(chunks), response.headers, None, None)
+    finally:
+        response.close()
+
+def _fetch_feed_streaming(feed_url, deadline, validators=None, high_water=None):
+    """
+    1つのフィードを受信しながら逐次解析し、high-water mark に達した時点で
+    受信そのものを打ち切る。フィードの向きは _newest_first_lazily が先頭の数件で判定し、
+    古い順のフィードだけは最後まで読んでから新しい順にそろえる。
+    XML として解析できない場合は全文取得 (feedparser) にフォールバックする。
+    """
+    response = _get(feed_url, deadline, validators)
+    try:
+        if response.status_code == 304:
+            return FeedResponse(304, None, response.headers, None, None)
+        response.raise_for_status()
+
+        entries = _newest_first_lazily(iter_feed_entries(_DeadlineReader(response.raw, deadline)))
+        newest = next(entries, None)
+        if newest is None:
+            return FeedResponse(response.status_code, None, response.headers, [], None)
+        taken = _take_entries_above_high_water(itertools.chain([newest], entries), high_water)
+        return FeedResponse(response.status_code, None, response.headers, taken, newest)
+    except ET.ParseError as e:
+        print(f"  > 警告: ストリーミング解析に失敗したため全文取得に切り替えます ({feed_url}) - {e}")
+        return _fetch_feed_body(feed_url, deadline)
+    finally:
+        response.close()
+
+_FEED_FETCHERS = {
+    'feedparser': _fetch_feed_body,
+    'stream': _fetch_feed_streaming,
+}
+
+def _parser_backend(feed_url, fetch_settings):
+    """フィードごとの解析方式 ('feedparser' / 'stream') を返す"""
+    overrides = fetch_settings.get('parser_backend_overrides', {})
+    backend = overrides.get(feed_url, fetch_settings.get('parser_backend', 'feedparser'))
+    if backend not in _FEED_FETCHERS:
+        print(f"警告: 不明な parser_backend '{backend}' のため feedparser を使います ({feed_url})")
+        return 'feedparser'
+    return backend
+
+def _fetch_with_deadline(fetcher, started, feed_url, timeout_sec, validators, high_water):
+    """ワーカーで動き始めた時刻を記録し、そこから timeout_sec 後を期限としてフィードを取得する"""
+    started[feed_url] = time.monotonic()
+    return fetcher(feed_url, started[feed_url] + timeout_sec, validators, high_water)
+
+def fetch_all_feeds(feed_urls, fetch_settings, validators_by_url=None, high_water_marks=None):
+    """
+    すべてのフィードをスレッドプールで並列にダウンロードする。
+    戻り値は {feed_url: FeedResponse} または {feed_url: Exception}。
+    期限はフィードごとに、ワーカーで取得が始まった時点から timeout_sec で数える
+    （max_workers より多いフィードがあっても、順番待ちの時間は含まない）。
+    受信の途中でも期限を過ぎたら打ち切り、間に合わなかったフィードは TimeoutError として扱う
+    （応答しないホストが他のフィードを巻き込まない）。
+    """
+    max_workers = max(1, int(fetch_settings.get('max_workers', 8)))
+    timeout_sec = float(fetch_settings.get('timeout_sec', 30))
+    validators_by_url = validators_by_url or {}
+    high_water_marks = high_water_marks or {}
+
+    results = {}
+    started = {}  # feed_url → ワーカーで取得が始まった時刻 (time.monotonic())
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, max(1, len(feed_urls))))
+    try:
+        futures = {
+            executor.submit(
+                _fetch_with_deadline, _FEED_FETCHERS[_parser_backend(url, fetch_settings)], started,
+                url, timeout_sec, validators_by_url.get(url), high_water_marks.get(url)
+            ): url
+            for url in feed_urls
+        }
+        pending = set(futures)
+        while pending:
+            # 始まっているフィードのうち、いちばん早い期限まで待つ
+            deadlines = [started[futures[f]] + timeout_sec for f in pending if futures[f] in started]
+            wait_sec = max(0, min(deadlines) - time.monotonic()) if deadlines else timeout_sec
+            done, pending = wait(pending, timeout=wait_sec, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = futures[future]
+                try:
+                    results[url] = future.result()
+                except Exception as e:
+                    results[url] = e
+            now = time.monotonic()
+            for future in list(pending):
+                url = futures[future]
+                if url in started and now >= started[url] + timeout_sec:
+                    # ワーカー側も次の読み込みで期限切れに気づいて終わる
+                    pending.discard(future)
+                    results[url] = TimeoutError(f"{timeout_sec}秒以内に取得できませんでした")
+    finally:
+        # 応答待ちのスレッドは待たずに先へ進む
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+def _load_feed_validators(conn):
+    """feed_cache から {feed_url: {'etag', 'last_modified', 'content_hash'}} を読み込む"""
+    rows = conn.execute("SELECT feed_url, etag, last_modified, content_hash FROM feed_cache").fetchall()
+    return {row['feed_url']: dict(row) for row in rows}
+
+def _save_feed_validators(conn, feed_url, headers, content_hash):
+    """レスポンスの ETag / Last-Modified と本文ハッシュを feed_cache に保存する"""
+    conn.execute("""
+        INSERT INTO feed_cache (feed_url, etag, last_modified, content_hash, fetched_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(feed_url) DO UPDATE SET
+            etag = excluded.etag,
+            last_modified = excluded.last_modified,
+            content_hash = excluded.content_hash,
+            fetched_at = excluded.fetched_at
+    """, (feed_url, headers.get('ETag'), headers.get('Last-Modified'), content_hash))
+    conn.commit()
+
+# ===== high-water mark による走査の打ち切り =====
+
+def _load_high_water_marks(conn):
+    """feed_high_water から {feed_url: (last_entry_id, last_published_datetime)} を読み込む"""
+    rows = conn.execute(
+        "SELECT feed_url, last_entry_id, last_published_date FROM feed_high_water"
+    ).fetchall()
+    return {
+        row['feed_url']: (row['last_entry_id'], parse_utcish(row['last_published_date']))
+        for row in rows
+    }
+
+def _save_high_water_mark(conn, feed_url, entry_id, dt_utc):
+    """フィードで見た最新エントリーを high-water mark として保存する"""
+    conn.execute("""
+        INSERT INTO feed_high_water (feed_url, last_entry_id, last_published_date, updated_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(feed_url) DO UPDATE SET
+            last_entry_id = excluded.last_entry_id,
+            last_published_date = excluded.last_published_date,
+            updated_at = excluded.updated_at
+    """, (feed_url, entry_id, dt_utc.isoformat() if dt_utc else None))
+    conn.commit()
+
+def _newest_first(entries):
+    """
+    エントリーを新しい順に並べて返す。
+    ほとんどのフィードは新しい順だが、古い順のフィードでも打ち切りが誤作動しないよう
+    先頭と末尾の日付だけを比べて向きを判定する。
+    """
+    entries = list(entries)
+    if len(entries) >= 2:
+        first = _choose_entry_datetime_utc(entries[0])
+        last = _choose_entry_datetime_utc(entries[-1])
+        if first < last:
+            entries.reverse()
+    return entries
+
+# _newest_first_lazily がフィードの向きを判定するために先読みする最大件数
+_ORIENTATION_PEEK = 10
+
+def _newest_first_lazily(entries):
+    """
+    _newest_first の逐次版（ストリーミング解析用）。先頭から日付の異なる2件を見て向きを判定し、
+    新しい順のフィードは読みながらそのまま返す（呼び出し側が走査をやめれば読み込みも止まる）。
+    古い順と判定したフィードだけは最後まで読んで逆順にする。
+    _ORIENTATION_PEEK 件までに判定できなければ新しい順とみなす。
+    """
+    iterator = iter(entries)
+    peeked = []
+    dates = []
+    for entry in iterator:
+        peeked.append(entry)
+        dt = _entry_datetime_utc(entry)
+        if dt is not None and (not dates or dt != dates[-1]):
+            dates.append(dt)
+        if len(dates) == 2 or len(peeked) >= _ORIENTATION_PEEK:
+            break
+    if len(dates) == 2 and dates[0] < dates[1]:
+        entries = peeked + list(iterator)
+        entries.reverse()
+        return iter(entries)
+    return itertools.chain(peeked, iterator)
+
+def _take_entries_above_high_water(entries, high_water):
+    """
+    新しい順のエントリーを先頭から走査し、前回の high-water mark
+    （同じ unique_id か、それより古い日付）に達したところで打ち切る。
+    """
+    if not high_water:
+        return list(entries)
+    last_entry_id, last_dt = high_water
+    taken = []
+    for entry in entries:
+        entry_id = entry.get('id') or entry.get('link')
+        if entry_id == last_entry_id:
+            break
+        if last_dt and _choose_entry_datetime_utc(entry) < last_dt:
+            break
+        taken.append(entry)
+    return taken
+
+# ===== 新規エントリーの判定と一括書き込み =====
+
+# SQLite のバインド変数上限に余裕を持たせた IN 句の分割サイズ
+_UNIQUE_ID_CHUNK_SIZE = 500
+
+def _load_known_unique_ids(conn, unique_ids):
+    """与えられた unique_id のうち、既に content に存在するものを1回の問い合わせ（分割）で集合として返す"""
+    known = set()
+    ids = [uid for uid in dict.fromkeys(unique_ids) if uid]
+    for i in range(0, len(ids), _UNIQUE_ID_CHUNK_SIZE):
+        chunk = ids[i:i + _UNIQUE_ID_CHUNK_SIZE]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT unique_id FROM content WHERE unique_id IN ({placeholders})", chunk
+        ).fetchall()
+        known.update(row['unique_id'] for row in rows)
+    return known
 
-def process_feeds():
-    """設定されたすべてのフィードを処理する"""
-    config = load_config()
-    conn = get_db_connection()
+def _build_draft(config, engine, media_id, entry_title, entry_link, published_date=None):
+    """
+    X投稿の下書き (message, scheduled_at, image_path, screenshot_url) を組み立てる。
+    mode=auto のスクリーンショットはここでは撮らず、screenshot_url として返して
+    ジョブキューに積む（撮影は `helhub.py screenshots work` が別途行う）。
+    mode=card のカード画像はブラウザ不要で速いため、ここで描画して添付する。
+    下書きを作らない場合は None を返す。
+    """
+    post_media_info = config.get('media_templates', {}).get(media_id, {})
+    x_template = post_media_info.get('x_post_template', {})
+
+    if not x_template.get('is_active', False):
+        print(f"  > [{media_id}]のX投稿が無効なため、下書き作成をスキップします。")
+        return None
+
+    if engine.excluded_keyword(media_id, entry_title):
+        print(f"  > X投稿スキップ: 除外キーワードがタイトルに含まれています。")
+        return None
+
+    message = x_template.get('template', '{title}\n{link}').format(title=entry_title, link=entry_link)
+    # NG: naiveのnowをそのまま文字列化
+    # scheduled_at = (datetime.now() + timedelta(hours=1)).isoformat(timespec='seconds')
+    # OK: かならずUTC化してZで保存
+    scheduled_at = isoformat_utc(now_utc() + timedelta(hours=1))
+
+    image_path = None
+    screenshot_url = None
+    img_settings = x_template.get('image_settings', {})
+    if img_settings.get('attach_image'):
+        if img_settings.get('mode') == 'auto':
+            screenshot_url = entry_link
+        elif img_settings.get('mode') == 'manual':
+            image_path = img_settings.get('manual_path', None)
+        elif img_settings.get('mode') == 'card':
+            image_path = render_card(media_id, post_media_info, entry_title, published_date,
+                                     config.get('card_settings'))
+
+    return message, scheduled_at, image_path, screenshot_url
+
+def _ingest_feed_entries(conn, config, engine, media_ids_sharing_feed, entries):
+    """
+    1つのフィードのエントリー（新しい順）を古い順に処理し、新規コンテンツと下書きを
+    1トランザクションでまとめて書き込む。
+    既知の unique_id は最初に1回の問い合わせで取得する。
+    保存した新規コンテンツ数を返し、書き込みに失敗した場合はロールバックして None を返す。
+    """
+    entries = list(reversed(entries))
+    entry_ids = [entry.get('id') or entry.get('link') for entry in entries]
+    known_ids = _load_known_unique_ids(conn, entry_ids)
+
+    # 1) 書き込みの前に、新規エントリーを洗い出してまとめて分類し、下書きを組み立てる
+    new_entries = []
+    for entry, entry_id in zip(entries, entry_ids):
+        if entry_id in known_ids:
+            continue
+        known_ids.add(entry_id)  # 同じフィード内の重複エントリーも1件として扱う
+        new_entries.append((entry, entry_id))
+
+    classifications = engine.classify_many(
+        [entry.get('title', '') for entry, _ in new_entries], media_ids_sharing_feed
+    )
+
+    new_items = []
+    for (entry, entry_id), classification in zip(new_entries, classifications):
+        entry_title = entry.get('title', '')
+        entry_link = entry.get('link')
+
+        # 変更: dc:date を含む複数候補からUTCに正規化
+        dt_utc = _choose_entry_datetime_utc(entry)
+        published_date = dt_utc.isoformat()
+
+        print(f"  > 新規コンテンツ発見: {entry_title}")
+
+        current_media_id = classification.media_id
+        if not current_media_id:
+            print(f"  > どのメディアにも分類できませんでした: '{entry_title}' - スキップします。")
+            continue
+        if len(media_ids_sharing_feed) > 1:
+            print(f"  > [{current_media_id}]に分類しました ({classification.rule})")
+
+        draft = _build_draft(config, engine, current_media_id, entry_title, entry_link, published_date)
+        new_items.append((entry_id, current_media_id, entry_title, entry_link, published_date, draft))
+
+    if not new_items:
+        return 0
+
+    # 2) フィード単位で1トランザクションにまとめて書き込む
+    inserted = 0
+    try:
+        with conn:
+            cursor = conn.cursor()
+            for entry_id, media_id, entry_title, entry_link, published_date, draft in new_items:
+                cursor.execute("""
+                    INSERT OR IGNORE INTO content (unique_id, media_id, title, link, published_date)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (entry_id, media_id, entry_title, entry_link, published_date))
+                if cursor.rowcount == 0:
+                    print(f"  > 既に保存済みのため下書き作成をスキップします: {entry_title}")
+                    continue
+                inserted += 1
+                print(f"  > [{media_id}]としてDBに保存しました: {entry_title}")
+
+                if draft is None:
+                    continue
+                message, scheduled_at, image_path, screenshot_url = draft
+                cursor.execute("""
+                    INSERT INTO posts (media_id, status, scheduled_at, content_unique_id)
+                    VALUES (?, 'draft', ?, ?)
+                """, (media_id, scheduled_at, entry_id))
+                post_id = cursor.lastrowid
+
+                cursor.execute("""
+                    INSERT INTO post_threads (post_id, thread_order, message, image_path)
+                    VALUES (?, 1, ?, ?)
+                """, (post_id, message, image_path))
+                if screenshot_url:
+                    enqueue_screenshot(cursor, cursor.lastrowid, screenshot_url)
+                print(f"  > [{media_id}] X投稿の下書きを作成しました (投稿ID: {post_id})。")
+    except sqlite3.Error as e:
+        print(f"  > エラー: DBへの書き込みに失敗したため、このフィードの変更を取り消しました - {e}")
+        return None
+
+    print(f"  > {inserted}件の新規コンテンツを書き込みました。")
+    return inserted
+
+def process_feeds(full_rescan=False, config=None, conn=None):
+    """
+    設定されたすべてのフィードを処理し、新たに保存したコンテンツの件数を返す。
+    full_rescan=True のときは条件付きGETと high-water mark を無視し、
+    フィードの全エントリーを走査する（取りこぼしの補完用）。
+    config / conn を渡すとそれを使う（conn は閉じない）。update-web のパイプライン用。
+    """
+    if config is None:
+        config = load_config()
+    owns_conn = conn is None
+    if owns_conn:
+        conn = get_db_connection()
+    create_tables(conn)
+    # 分類ルール（正規表現のコンパイルを含む）は実行ごとに1回だけ組み立てる
+    engine = ClassificationEngine.from_config(config)
     
     feeds_to_process = {}
     for media_id, media_info in config.get('media_templates', {}).items():
@@ -136,91 +482,76 @@ def process_feeds():
             feeds_to_process[feed_url] = []
         feeds_to_process[feed_url].append(media_id)
 
+    # ダウンロードだけを並列に行い、分類とDB書き込みは config.json の順に直列で行う
+    fetch_settings = config.get('fetch_settings', {})
+    validators_by_url = {} if full_rescan else _load_feed_validators(conn)
+    high_water_marks = {} if full_rescan else _load_high_water_marks(conn)
+    if full_rescan:
+        print("--full-rescan: すべてのエントリーを再走査します。")
+    print(f"{len(feeds_to_process)}件のフィードを並列に取得しています...")
+    fetched = fetch_all_feeds(list(feeds_to_process), fetch_settings, validators_by_url, high_water_marks)
+
+    total_inserted = 0
     for feed_url, media_ids_sharing_feed in feeds_to_process.items():
         print(f"\n--- フィードを処理中: {feed_url} ---")
-        
-        feed = feedparser.parse(feed_url)
-        
-        for entry in reversed(feed.entries):
-            entry_id = entry.get('id') or entry.get('link')
-            entry_title = entry.get('title', '')
-            entry_link = entry.get('link')
-
-            # 変更: dc:date を含む複数候補からUTCに正規化
-            dt_utc = _choose_entry_datetime_utc(entry)
-            published_date = dt_utc.isoformat()
-            
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM content WHERE unique_id = ?", (entry_id,))
-            if cursor.fetchone():
-                continue
-                
-            print(f"  > 新規コンテンツ発見: {entry_title}")
 
-            current_media_id = _classify_entry_media_id_from_shared_feed(
-                entry_title, config, media_ids_sharing_feed
-            )
+        response = fetched.get(feed_url)
+        if isinstance(response, Exception) or response is None:
+            print(f"  > エラー: フィードの取得に失敗しました - {response}")
+            continue
+        if response.status == 304:
+            print("  > 変更なし (304 Not Modified)。解析をスキップします。")
+            continue
 
-            if not current_media_id:
-                print(f"  > どのメディアにも分類できませんでした: '{entry_title}' - スキップします。")
+        if response.entries is not None:
+            # ストリーミング解析: high-water mark での打ち切りまでワーカー側で済んでいる
+            content_hash = None
+            new_entries = response.entries
+            newest = response.newest_entry
+            print(f"  > ストリーミング解析: 新着の可能性がある{len(new_entries)}件のみを走査します。")
+        else:
+            # ETag 等に対応していないサーバーでも、本文が前回と同一なら解析しない
+            content_hash = hashlib.sha256(response.body).hexdigest()
+            cached = validators_by_url.get(feed_url, {})
+            if cached.get('content_hash') == content_hash:
+                print("  > 変更なし (本文ハッシュが前回と同一)。解析をスキップします。")
+                _save_feed_validators(conn, feed_url, response.headers, content_hash)
                 continue
 
-            try:
-                cursor.execute("""
-                    INSERT INTO content (unique_id, media_id, title, link, published_date)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (entry_id, current_media_id, entry_title, entry_link, published_date))
-                conn.commit()
-                print(f"  > [{current_media_id}]としてDBに保存しました。")
-            except sqlite3.IntegrityError:
-                print(f"  > DBへの保存中にIntegrityErrorが発生しました（unique_id重複？）。スキップします。")
-                continue
+            feed = feedparser.parse(response.body, response_headers=response.headers)
 
-            post_media_info = config.get('media_templates', {}).get(current_media_id, {})
-            x_template = post_media_info.get('x_post_template', {})
-            
-            if not x_template.get('is_active', False):
-                print(f"  > [{current_media_id}]のX投稿が無効なため、下書き作成をスキップします。")
-                continue
-            
-            if any(keyword in entry_title for keyword in x_template.get('exclude_keywords', [])):
-                print(f"  > X投稿スキップ: 除外キーワードがタイトルに含まれています。")
-                continue
+            # 新しい順に走査し、前回見た最新エントリーに達したら打ち切る
+            entries = _newest_first(feed.entries)
+            new_entries = _take_entries_above_high_water(entries, high_water_marks.get(feed_url))
+            newest = entries[0] if entries else None
+            if len(new_entries) < len(entries):
+                print(f"  > {len(entries)}件中、新着の可能性がある{len(new_entries)}件のみを走査します。")
 
-            message = x_template.get('template', '{title}\n{link}').format(title=entry_title, link=entry_link)
-            # NG: naiveのnowをそのまま文字列化
-            # scheduled_at = (datetime.now() + timedelta(hours=1)).isoformat(timespec='seconds')
-            # OK: かならずUTC化してZで保存
-            scheduled_at = isoformat_utc(datetime.now(timezone.utc) + timedelta(hours=1))
-            
-            image_path = None
-            img_settings = x_template.get('image_settings', {})
-            if img_settings.get('attach_image'):
-                if img_settings.get('mode') == 'auto':
-                    image_path = take_screenshot(entry_link)
-                elif img_settings.get('mode') == 'manual':
-                    image_path = img_settings.get('manual_path', None)
-
-            try:
-                cursor.execute("""
-                    INSERT INTO posts (media_id, status, scheduled_at, content_unique_id)
-                    VALUES (?, 'draft', ?, ?)
-                """, (current_media_id, scheduled_at, entry_id))
-                post_id = cursor.lastrowid
-                
-                cursor.execute("""
-                    INSERT INTO post_threads (post_id, thread_order, message, image_path)
-                    VALUES (?, 1, ?, ?)
-                """, (post_id, message, image_path))
-                
-                conn.commit()
-                print(f"  > [{current_media_id}] X投稿の下書きを作成しました (投稿ID: {post_id})。")
-            except Exception as e:
-                print(f"  > エラー: X投稿下書きの作成に失敗しました - {e}")
+        inserted = _ingest_feed_entries(conn, config, engine, media_ids_sharing_feed, new_entries)
+        if inserted is None:
+            continue
+        total_inserted += inserted
+
+        newest_id = (newest.get('id') or newest.get('link')) if newest is not None else None
+        if newest_id:
+            _save_high_water_mark(conn, feed_url, newest_id, _choose_entry_datetime_utc(newest))
+        elif newest is not None:
+            # id も link も無いエントリーは unique_id にできないので mark にも使わない（次回も全件を走査する）
+            print("  > 警告: 最新のエントリーに id / link が無いため、high-water mark を保存しません。")
+
+        # フィード全体を処理し終えてから検証子を保存する（途中で落ちたら次回は再解析）
+        _save_feed_validators(conn, feed_url, response.headers, content_hash)
 
-    conn.close()
-    print("\nすべてのフィード処理が完了しました。")
+    if owns_conn:
+        conn.close()
+    print(f"\nすべてのフィード処理が完了しました。(新規コンテンツ: {total_inserted}件)")
+    return total_inserted
 
 
 if __name__ == '__main__':
-    process_feeds()
+    import argparse
+    parser = argparse.ArgumentParser(description="RSSフィードを取得してDBと投稿下書きを更新します。")
+    parser.add_argument("--full-rescan", action="store_true",
+                        help="条件付きGETと high-water mark を無視して全エントリーを走査します（取りこぼしの補完用）。")
+    args = parser.parse_args()
+    process_feeds(full_rescan=args.full_rescan)
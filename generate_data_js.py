@@ -1,26 +1,93 @@
-import sqlite3
+import os
+import glob
+import gzip
 import json
-from datetime import datetime, timedelta
+import hashlib
+from datetime import datetime, timezone
+from collections import namedtuple
+from setup_database import create_tables, HUB_SNAPSHOT_RECENT_SCOPE, ARCHIVE_PAGE_SIZE
+from datetime_util import epoch_days_ago, get_zone
+from db_util import connect
+import config_util
+
+OUTPUT_FILENAME = 'hel-data.js'
+
+# config.json の site_output.mode（generate-js --mode で上書きできる）
+#   "development": 従来どおり indent=4 で整形して書き出す（読みやすいが大きい）
+#   "production" : 空白を除いた JSON にし、カードのアイコン (SVG) を helData.icons にまとめて番号で参照する。
+#                  さらに圧縮済みの hel-data.js.gz / hel-data.js.br を隣に書き出す（Web サーバーがそのまま返せる）
+DEFAULT_SITE_OUTPUT_MODE = 'development'
+
+# 圧縮済みファイルの拡張子。br は brotli パッケージが無ければ作らない
+PRECOMPRESSED_EXTENSIONS = ('gz', 'br')
+
+# 圧縮するときに _import_brotli() で初めてインポートする
+brotli = None
+
+# メディアごとの過去の記事 (archive/<media_id>-0001.json ...) と目次 (archive/index.json)。
+# どの記事をどのページに入れるかはDBのトリガーが決め (setup_database.ARCHIVE_PAGE_SIZE)、
+# 中身が変わったページは archive_pages.revision が増える。ページは古い順に番号を振り、番号はずれないので、
+# ふつうは最後のページと目次しか変わらない。各ページの中は新しい順。
+# サイトは目次を読み、「過去の記事」ボタンが押されたときに新しいページから順に読む。
+ARCHIVE_DIR = 'archive'
+ARCHIVE_INDEX = 'index.json'
+# config.json の site_archive で上書きできる
+DEFAULT_ARCHIVE_SETTINGS = {
+    "tz": "Asia/Tokyo",    # 記事の日付を表示するタイムゾーン
+}
+
+# 最後に生成したときの設定と hel-data.js のハッシュ（update-web が生成を省略してよいかの判定に使う）。
+# hel-data.js は内容が同じなら書き換えず mtime も古いままなので、mtime では判定できない
+GENERATE_STAMP = '.hel-data.stamp'
+
+# generate_data_js の結果。changed が False なら既存のファイルと同じ内容で、書き換えていない
+GeneratedFile = namedtuple('GeneratedFile', ['path', 'changed', 'sha256'])
 
 def load_config():
     """設定ファイルを読み込む"""
     try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return config_util.load_config()
     except (FileNotFoundError, json.JSONDecodeError) as e:
         print(f"!!! エラー: 'config.json' が見つからないか、JSONの書式が正しくありません。")
         print(f"詳細: {e}")
         return None
+    except config_util.ConfigError as e:
+        print(f"!!! エラー: {e}")
+        return None
 
-def generate_data_js():
-    """config.jsonとDBからデータを取得し、hel-data.jsをゼロから生成する"""
-    config = load_config()
-    if not config:
-        print("config.jsonを読み込めなかったため、処理を中断します。")
-        return
+def _import_brotli():
+    """brotli を読み込む。使えなければ False"""
+    global brotli
+    if brotli is None:
+        try:
+            import brotli
+        except ImportError:
+            return False
+    return True
 
-    db_path = config.get('database_path', 'content.db')
-    
+def site_output_mode(config, mode=None):
+    return mode or config.get('site_output', {}).get('mode', DEFAULT_SITE_OUTPUT_MODE)
+
+def precompressed_extensions():
+    """この環境で作れる圧縮済みファイルの拡張子"""
+    return [ext for ext in PRECOMPRESSED_EXTENSIONS if ext != 'br' or _import_brotli()]
+
+def output_files(config, mode=None):
+    """generate-js が書き出すファイル（deploy の配信対象）"""
+    files = [OUTPUT_FILENAME]
+    if site_output_mode(config, mode) == 'production':
+        files += [f"{OUTPUT_FILENAME}.{ext}" for ext in precompressed_extensions()]
+    return files + archive_files()
+
+def archive_files():
+    """過去の記事の目次と、今あるページのファイル"""
+    pages = sorted(glob.glob(os.path.join(ARCHIVE_DIR, '*-[0-9][0-9][0-9][0-9].json')))
+    return [f"{ARCHIVE_DIR}/{ARCHIVE_INDEX}"] + [f"{ARCHIVE_DIR}/{os.path.basename(p)}" for p in pages]
+
+def build_hel_data(config, conn):
+    """
+    サイトに表示するデータ (helData) を dict で返す。hel-data.js と build-site の両方で使う。
+    """
     # 1. config.jsonから静的な骨格を構築
     hel_data = {
         "announcements": config.get("announcements", []),
@@ -28,27 +95,31 @@ def generate_data_js():
         "cards": []
     }
     
-    # 2. データベースに接続
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    # 3. 「新着コンテンツ」セクションをDBから生成
-    three_days_ago = (datetime.now() - timedelta(days=3)).isoformat()
-    cursor.execute("""
-        SELECT media_id, title, link FROM content
-        WHERE published_date >= ?
-        ORDER BY published_date DESC
-        LIMIT 10
-    """, (three_days_ago,))
-    
-    for row in cursor.fetchall():
+    # 2. データベースの準備
+    create_tables(conn)  # published_epoch などが未作成の古いDBにも対応
+
+    # 3. hub_snapshot（トリガーで保守される、メディアごと・全体の最新件）を1回で読む
+    latest_by_scope = {}
+    for row in conn.execute("""
+        SELECT scope, media_id, title, link, published_epoch FROM hub_snapshot
+        ORDER BY scope, published_epoch DESC, content_id DESC
+    """):
+        latest_by_scope.setdefault(row['scope'], []).append(row)
+
+    # 「新着コンテンツ」セクション（全体の最新件のうち直近3日、UTCの整数で比較）
+    cutoff = epoch_days_ago(3)
+    for row in latest_by_scope.get(HUB_SNAPSHOT_RECENT_SCOPE, []):
+        if row['published_epoch'] < cutoff:
+            break
         hel_data['newContent'].append({
             "media": row['media_id'],
             "title": row['title'],
             "url": row['link']
         })
 
+    # メディアごとの記事数（カードの「過去の記事」ボタンに使う。トリガーで保守される archive_pages から数える）
+    counts = dict(conn.execute("SELECT media_id, SUM(item_count) FROM archive_pages GROUP BY media_id").fetchall())
+
     # 4. config.jsonの各メディア情報からカードを一枚ずつ構築
     for media_id, media_info in config.get('media_templates', {}).items():
         card = {
@@ -59,18 +130,13 @@ def generate_data_js():
             "bgColor": media_info.get("bgColor"),
             "description": media_info.get("description"),
             "link": media_info.get("link"),
+            "archiveCount": counts.get(media_id, 0),
             "contentItems": []
         }
         
-        # 動的コンテンツをDBから取得 (最新5件)
-        cursor.execute("""
-            SELECT title, link FROM content
-            WHERE media_id = ?
-            ORDER BY published_date DESC
-            LIMIT 5 
-        """, (media_id,))
-        
-        dynamic_items = [{"title": row['title'], "url": row['link']} for row in cursor.fetchall()]
+        # 動的コンテンツ (最新5件)
+        dynamic_items = [{"title": row['title'], "url": row['link']}
+                         for row in latest_by_scope.get(media_id, [])]
         
         # 固定コンテンツをconfig.jsonから取得し、isFixedフラグを付与
         fixed_items = []
@@ -83,17 +149,236 @@ def generate_data_js():
         
         hel_data["cards"].append(card)
 
-    conn.close()
-    
-    # 5. 完成したデータをJavaScriptファイルとして書き出し
+    return hel_data
+
+def generate_data_js(config=None, conn=None, mode=None):
+    """
+    config.jsonとDBからデータを取得し、hel-data.jsをゼロから生成する。過去の記事 (archive/) も更新する。
+    結果を GeneratedFile で返す（中断した場合は None）。
+    生成した内容が既存のファイルと同じなら書き換えない（mtime も変わらないので、
+    deploy も再アップロードしない）。内容が変わったときは一時ファイルに書いてから置き換える。
+    config / conn を渡すとそれを使う（conn は閉じない）。update-web のパイプライン用。
+    mode は "development" / "production"（省略時は config.json の site_output.mode）。
+    """
+    if config is None:
+        config = load_config()
+    if not config:
+        print("config.jsonを読み込めなかったため、処理を中断します。")
+        return None
+
+    owns_conn = conn is None
+    if owns_conn:
+        conn = connect(config=config)
+    try:
+        hel_data = build_hel_data(config, conn)
+        generate_archive(config, conn)
+    finally:
+        if owns_conn:
+            conn.close()
+
+    # 5. 完成したデータをJavaScriptファイルとして書き出し（内容が変わったときだけ）
+    mode = site_output_mode(config, mode)
+    payload = _serialize(hel_data, mode)
+    result = write_if_changed(OUTPUT_FILENAME, payload)
+
+    if result.changed:
+        print(f"'{result.path}' の生成が完了しました。")
+    else:
+        print(f"'{result.path}' は前回と同じ内容のため、書き換えませんでした。")
+    if mode == 'production':
+        write_precompressed(result, payload)
+        _print_size_report(hel_data, payload)
+    else:
+        remove_precompressed(OUTPUT_FILENAME)
+    _write_stamp(config, mode, result.sha256)
+    return result
+
+def _config_digest(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def _write_stamp(config, mode, payload_sha256):
+    stamp = {"config": _config_digest(config), "mode": mode, "payload": payload_sha256}
+    write_if_changed(GENERATE_STAMP, json.dumps(stamp).encode('utf-8'))
+
+def site_data_is_current(config):
+    """
+    最後の生成から設定 (config) が変わっておらず、出力ファイルがそろっていて、
+    hel-data.js がそのとき書き出した内容のままなら True
+    """
+    try:
+        with open(GENERATE_STAMP, 'r', encoding='utf-8') as f:
+            stamp = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    if stamp.get("config") != _config_digest(config) or stamp.get("mode") != site_output_mode(config):
+        return False
+    if not all(os.path.exists(path) for path in output_files(config)):
+        return False
+    return _file_sha256(OUTPUT_FILENAME) == stamp.get("payload")
+
+def _archive_settings(config):
+    settings = dict(DEFAULT_ARCHIVE_SETTINGS)
+    settings.update(config.get("site_archive", {}))
+    return settings
+
+def _write_archive_page(conn, zone, media_id, page):
+    items = []
+    for row in conn.execute("""
+        SELECT c.title, c.link, c.published_epoch FROM archive_items a JOIN content c ON c.id = a.content_id
+         WHERE a.media_id = ? AND a.page = ?
+         ORDER BY c.published_epoch DESC, c.id DESC
+    """, (media_id, page)):
+        date = datetime.fromtimestamp(row['published_epoch'], timezone.utc).astimezone(zone).strftime('%Y-%m-%d')
+        items.append({"title": row['title'], "url": row['link'], "date": date})
+    payload = json.dumps(items, ensure_ascii=False, separators=(',', ':'))
+    return write_if_changed(os.path.join(ARCHIVE_DIR, f"{media_id}-{page:04d}.json"), payload.encode('utf-8'))
+
+def generate_archive(config, conn):
+    """
+    メディアごとの過去の記事をページに分けて archive/ に書き出す。archive_pages を読み、
+    前回書き出してから revision が変わったページ（とファイルが無いページ）だけを作り直す。
+    config に無いメディアのファイルは削除する。書き換えたファイルの数を返す。
+    """
+    zone = get_zone(_archive_settings(config)["tz"])
+    media_ids = set(config.get('media_templates', {}))
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    index = {"pageSize": ARCHIVE_PAGE_SIZE, "media": {}}
+    expected = set()
+    changed = []
+    written = []
+    for row in conn.execute("""
+        SELECT media_id, page, item_count, revision, written_revision, sha256 FROM archive_pages
+        ORDER BY media_id, page
+    """).fetchall():
+        media_id, page = row['media_id'], row['page']
+        if media_id not in media_ids:
+            continue
+        name = f"{media_id}-{page:04d}.json"
+        expected.add(name)
+        sha256 = row['sha256']
+        if row['revision'] != row['written_revision'] or not sha256 or not os.path.exists(os.path.join(ARCHIVE_DIR, name)):
+            result = _write_archive_page(conn, zone, media_id, page)
+            sha256 = result.sha256
+            # 書き出している間にトリガーが revision を増やしていたら、次回もう一度作り直す
+            written.append((row['revision'], sha256, media_id, page))
+            if result.changed:
+                changed.append(name)
+        entry = index["media"].setdefault(media_id, {"count": 0, "pages": []})
+        entry["count"] += row['item_count']
+        # サイトはこの値を ?v= に付けて読むので、変わったページだけブラウザのキャッシュが外れる
+        entry["pages"].append(sha256[:10])
+    if written:
+        with conn:
+            conn.executemany("""
+                UPDATE archive_pages SET written_revision = ?, sha256 = ? WHERE media_id = ? AND page = ?
+            """, written)
+
+    payload = json.dumps(index, ensure_ascii=False, separators=(',', ':'))
+    if write_if_changed(os.path.join(ARCHIVE_DIR, ARCHIVE_INDEX), payload.encode('utf-8')).changed:
+        changed.append(ARCHIVE_INDEX)
+    for path in glob.glob(os.path.join(ARCHIVE_DIR, '*-[0-9][0-9][0-9][0-9].json')):
+        if os.path.basename(path) not in expected:
+            os.remove(path)
+            print(f"  > 使われなくなった '{path}' を削除しました。")
+
+    if changed:
+        print(f"過去の記事 ({len(expected)}ページ) のうち、{len(changed)}件のファイルを更新しました: {', '.join(changed[:5])}"
+              + (" ..." if len(changed) > 5 else ""))
+    else:
+        print(f"過去の記事 ({len(expected)}ページ) に変更はありません。")
+    return len(changed)
+
+def _share_icons(hel_data):
+    """カードのアイコン (SVG) を helData.icons にまとめ、カードには番号だけを残す"""
+    icons = []
+    index_of = {}
+    for card in hel_data['cards']:
+        icon = card.get('icon')
+        if icon is None:
+            continue
+        if icon not in index_of:
+            index_of[icon] = len(icons)
+            icons.append(icon)
+        card['icon'] = index_of[icon]
+    hel_data['icons'] = icons
+
+def _serialize(hel_data, mode):
+    """hel-data.js の中身 (bytes)"""
+    if mode == 'production':
+        compact = dict(hel_data, cards=[dict(card) for card in hel_data['cards']])
+        _share_icons(compact)
+        data = json.dumps(compact, ensure_ascii=False, separators=(',', ':'))
+        return f"const helData={data};".encode('utf-8')
     # ★ 修正点: "export" を削除
-    js_content = f"const helData = {json.dumps(hel_data, indent=4, ensure_ascii=False)};"
-    
-    output_filename = 'hel-data.js'
-    with open(output_filename, 'w', encoding='utf-8') as f:
-        f.write(js_content)
-        
-    print(f"'{output_filename}' の生成が完了しました。")
+    return f"const helData = {json.dumps(hel_data, indent=4, ensure_ascii=False)};".encode('utf-8')
+
+def _compress(payload, ext):
+    if ext == 'gz':
+        # mtime=0 にして、同じ内容なら同じバイト列になるようにする
+        return gzip.compress(payload, compresslevel=9, mtime=0)
+    return brotli.compress(payload, quality=11)
+
+def write_precompressed(result, payload):
+    """
+    result.path (GeneratedFile) の隣に .gz / .br を書き出す（build-site の index.html / site.css でも使う）。
+    元のファイルが変わっていなければ、既にあるものは作り直さない。
+    """
+    extensions = precompressed_extensions()
+    if 'br' not in extensions:
+        print(f"警告: brotli がインストールされていないため、{result.path}.br は作成しません。")
+    for ext in extensions:
+        path = f"{result.path}.{ext}"
+        if result.changed or not os.path.exists(path):
+            write_if_changed(path, _compress(payload, ext))
+
+def remove_precompressed(source_path):
+    """development で書き出したときは、古い内容の圧縮済みファイルを残さない"""
+    for ext in PRECOMPRESSED_EXTENSIONS:
+        path = f"{source_path}.{ext}"
+        if os.path.exists(path):
+            os.remove(path)
+            print(f"  > 古い '{path}' を削除しました。")
+
+def _print_size_report(hel_data, payload):
+    """development（整形）で書き出した場合とのサイズの比較を表示する"""
+    def kb(size):
+        return f"{size / 1024:.1f} KB"
+    before = len(_serialize(hel_data, 'development'))
+    sizes = [f"{OUTPUT_FILENAME} {kb(len(payload))}"]
+    for ext in precompressed_extensions():
+        path = f"{OUTPUT_FILENAME}.{ext}"
+        sizes.append(f"{ext} {kb(os.path.getsize(path))}")
+    smallest = min(os.path.getsize(f"{OUTPUT_FILENAME}.{ext}") for ext in precompressed_extensions())
+    print(f"  > サイズ: 整形時 {kb(before)} → {' / '.join(sizes)}"
+          f"（転送量は整形時の {smallest / before:.0%}）")
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_if_changed(path, payload):
+    """
+    payload (bytes) を path に書き出す。既存のファイルと内容が同じなら何もしない。
+    サイズが違えばハッシュを比べるまでもなく変更ありとみなす。書き出しは一時ファイル経由で
+    置き換えるので、途中で失敗しても壊れたファイルが残らない（アップロード中に読まれても安全）。
+    """
+    sha256 = hashlib.sha256(payload).hexdigest()
+    try:
+        unchanged = os.path.getsize(path) == len(payload) and _file_sha256(path) == sha256
+    except FileNotFoundError:
+        unchanged = False
+    if unchanged:
+        return GeneratedFile(path, False, sha256)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return GeneratedFile(path, True, sha256)
 
 if __name__ == '__main__':
     generate_data_js()
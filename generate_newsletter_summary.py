@@ -1,36 +1,32 @@
-import sqlite3
-import json
-from datetime import datetime, timedelta
-
-def load_config():
-    """設定ファイルを読み込む"""
-    with open('config.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+from datetime import timedelta
+from setup_database import create_tables
+from datetime_util import now_utc, to_epoch, get_zone
+from db_util import connect
+from config_util import load_config
 
 def generate_newsletter_summary():
     """指定された期間の最新コンテンツをまとめたテキストファイルを生成する"""
     config = load_config()
-    db_path = config.get('database_path', 'content.db')
     settings = config.get('helmaga_generator', {})
     
     days_to_summarize = settings.get('days_to_summarize', 7)
     output_filename = settings.get('output_filename', 'newsletter_summary.md')
     
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    conn = connect(config=config)
+    create_tables(conn)  # published_epoch などが未作成の古いDBにも対応
     cursor = conn.cursor()
 
-    # 集計期間を計算
-    end_date = datetime.now()
+    # 集計期間を計算（UTC で比較し、見出しの日付だけ日本時間で表示する）
+    end_date = now_utc()
     start_date = end_date - timedelta(days=days_to_summarize)
     
     # 期間内のコンテンツを媒体ごとに取得
     cursor.execute("""
         SELECT media_id, title, link
         FROM content
-        WHERE published_date >= ? AND published_date <= ?
-        ORDER BY media_id, published_date DESC
-    """, (start_date.isoformat(), end_date.isoformat()))
+        WHERE published_epoch BETWEEN ? AND ?
+        ORDER BY media_id, published_epoch DESC
+    """, (to_epoch(start_date), to_epoch(end_date)))
     
     all_content = cursor.fetchall()
     conn.close()
@@ -49,7 +45,7 @@ def generate_newsletter_summary():
 
     # Markdown形式でファイルを出力
     with open(output_filename, 'w', encoding='utf-8') as f:
-        f.write(f"# 今週のhel活 ({end_date.strftime('%Y-%m-%d')} 生成)\n")
+        f.write(f"# 今週のhel活 ({end_date.astimezone(get_zone('Asia/Tokyo')).strftime('%Y-%m-%d')} 生成)\n")
         f.write(f"（過去{days_to_summarize}日間の新着コンテンツ）\n\n")
         f.write("====================\n\n")
         
@@ -3,38 +3,65 @@ import subprocess
 import sys
 import os
 
-# 各スクリプトのメイン関数をインポート
-from setup_database import setup_database
-from fetch_feeds import process_feeds
-from generate_data_js import generate_data_js
-from manage_posts_cli import main as manage_posts_main # ★ インポート方法を変更
-from post_to_x import post_scheduled_tweets
-from update_and_upload import main as update_and_upload_main
-from generate_newsletter_summary import generate_newsletter_summary
+from config_util import load_config, ConfigError
 
 # --- ラッパー関数 ---
 # これらは、argparse が引数なしで呼び出せるようにするためのものです。
+# 各コマンドのモジュールは実行するときに初めてインポートする。init-db や generate-js のように
+# 軽いコマンドでも playwright / tweepy / feedparser などを読み込んで起動が遅くならないようにするため
+# （scripts/bench_import_time.py で確認できる）。
 def run_setup_database(args):
+    from setup_database import setup_database
     setup_database()
 
+def run_migrations_command(args):
+    from setup_database import run_migrations
+    run_migrations()
+
 def run_fetch_feeds(args):
-    process_feeds()
+    from fetch_feeds import process_feeds
+    process_feeds(full_rescan=args.full_rescan)
 
 def run_generate_data_js(args):
-    generate_data_js()
+    from generate_data_js import generate_data_js
+    generate_data_js(mode=args.mode)
+
+def run_build_site(args):
+    from build_site import build_site
+    build_site()
 
 def run_manage_posts(args):
+    from manage_posts_cli import main as manage_posts_main # ★ インポート方法を変更
     manage_posts_main() # ★ 呼び出す関数名を変更
 
 def run_post_scheduled_tweets(args):
+    from post_to_x import post_scheduled_tweets
     post_scheduled_tweets()
 
 def run_update_and_upload(args):
-    update_and_upload_main()
+    from update_and_upload import main as update_and_upload_main
+    update_and_upload_main(force=args.force)
+
+def run_deploy(args):
+    from deploy import deploy_targets
+    deploy_targets(args.targets or ["helhub"], force=args.force, dry_run=args.dry_run, mark_deployed=args.mark_deployed)
 
 def run_generate_newsletter_summary(args):
+    from generate_newsletter_summary import generate_newsletter_summary
     generate_newsletter_summary()
 
+def run_screenshots_work(args):
+    from screenshot_queue import work_screenshot_jobs
+    work_screenshot_jobs(workers=args.workers, limit=args.limit)
+
+def run_screenshots_prune(args):
+    from screenshot_cache import prune_screenshot_cache
+    prune_screenshot_cache()
+
+def run_screenshots_status(args):
+    from screenshot_queue import show_screenshot_jobs
+    show_screenshot_jobs()
+
 def run_custom_hellog_command(args):
     """ユーザー定義のカスタムコマンドを実行するサンプル"""
     # config.jsonからパスを取得するか、ここに直接記述します
@@ -69,6 +96,10 @@ def main():
     parser_init = subparsers.add_parser("init-db", help="データベースを初期化します。")
     parser_init.set_defaults(func=run_setup_database)
 
+    # migrate コマンド
+    parser_migrate = subparsers.add_parser("migrate", help="既存のデータベースのスキーマを最新のバージョンに更新します。")
+    parser_migrate.set_defaults(func=run_migrations_command)
+
     # fetch コマンド
     parser_fetch = subparsers.add_parser(
         "fetch", 
@@ -76,20 +107,40 @@ def main():
         description=(
             "設定ファイル(config.json)に従って全メディアのRSSフィードを取得します。\n"
             "取得したコンテンツはDBに保存され、'filtering_rules' (正規表現を含む) に基づいて\n"
-            "フィルタリングされた後、Xへの投稿下書きが自動で作成されます。"
+            "フィルタリングされた後、Xへの投稿下書きが自動で作成されます。\n"
+            "通常は前回見た最新エントリーまでで走査を打ち切ります。"
         ),
         formatter_class=argparse.RawTextHelpFormatter
     )
+    parser_fetch.add_argument(
+        "--full-rescan", action="store_true",
+        help="条件付きGETと high-water mark を無視してフィードの全エントリーを走査します（取りこぼしの補完用）。"
+    )
     parser_fetch.set_defaults(func=run_fetch_feeds)
 
     # generate-js コマンド
-    parser_gen_js = subparsers.add_parser("generate-js", help="DBからウェブサイト用のhel-data.jsを生成します。")
+    parser_gen_js = subparsers.add_parser("generate-js", help="DBから過去の記事 (archive/) とテンプレート確認用の hel-data.js を生成します。")
+    parser_gen_js.add_argument("--mode", choices=["development", "production"],
+                               help="出力形式 (省略時は config.json の site_output.mode)。production は空白を除き、.gz / .br も書き出します。")
     parser_gen_js.set_defaults(func=run_generate_data_js)
 
+    # build-site コマンド
+    parser_build_site = subparsers.add_parser("build-site", help="site_template.html からカードなどを描画済みの index.html と、使うクラスだけの site.css を作ります。")
+    parser_build_site.set_defaults(func=run_build_site)
+
     # update-web コマンド
-    parser_update_web = subparsers.add_parser("update-web", help="ウェブサイトの更新とアップロードを全自動で行います。 (fetch -> generate-js -> upload)")
+    parser_update_web = subparsers.add_parser("update-web", help="ウェブサイトの更新とアップロードを全自動で行います。 (fetch -> generate-js -> build-site -> upload)")
+    parser_update_web.add_argument("--force", action="store_true", help="新規コンテンツが無くても hel-data.js を生成し、すべてのファイルをアップロードします。")
     parser_update_web.set_defaults(func=run_update_and_upload)
 
+    # deploy コマンド
+    parser_deploy = subparsers.add_parser("deploy", help="配信先 (config.json の deploy_targets) のファイルのうち、前回の配信から変わったものだけをアップロードします。")
+    parser_deploy.add_argument("targets", nargs="*", help="配信先の名前。複数指定すると SFTP の接続を共有します (既定: helhub = index.html / site.css / archive/ / README.md)")
+    parser_deploy.add_argument("--dry-run", action="store_true", help="アップロードするファイルを表示するだけで、送信しません。")
+    parser_deploy.add_argument("--force", action="store_true", help="変更の有無にかかわらず、すべてのファイルをアップロードします。")
+    parser_deploy.add_argument("--mark-deployed", action="store_true", help="アップロードせずに、今のファイルを配信済みとして記録します (サーバーと同じ状態から使い始めるとき)。")
+    parser_deploy.set_defaults(func=run_deploy)
+
     # manage-posts コマンド
     parser_manage = subparsers.add_parser("manage-posts", help="Xへの投稿を下書きの確認、編集、承認、予約など対話形式で管理します。")
     parser_manage.set_defaults(func=run_manage_posts)
@@ -102,6 +153,18 @@ def main():
     parser_news = subparsers.add_parser("generate-news", help="DBからメルマガ用の原稿(markdown)を生成します。")
     parser_news.set_defaults(func=run_generate_newsletter_summary)
 
+    # screenshots コマンド
+    parser_shots = subparsers.add_parser("screenshots", help="fetch が登録したスクリーンショット撮影ジョブを処理します。")
+    shots_subparsers = parser_shots.add_subparsers(dest="screenshots_command", required=True)
+    parser_shots_work = shots_subparsers.add_parser("work", help="実行待ちのジョブを撮影し、下書きに画像を添付します。")
+    parser_shots_work.add_argument("--workers", type=int, help="1つのブラウザで同時に開くページ数 (既定: config.json の screenshot_settings.workers)")
+    parser_shots_work.add_argument("--limit", type=int, help="今回処理するジョブの最大件数")
+    parser_shots_work.set_defaults(func=run_screenshots_work)
+    parser_shots_status = shots_subparsers.add_parser("status", help="ジョブの状態を表示します。")
+    parser_shots_status.set_defaults(func=run_screenshots_status)
+    parser_shots_prune = shots_subparsers.add_parser("prune", help="screenshots/ を索引に取り込み、サイズ上限を超えた古い画像を削除します。")
+    parser_shots_prune.set_defaults(func=run_screenshots_prune)
+
     # hellog カスタムコマンド (サンプル)
     parser_hellog = subparsers.add_parser("hellog", help="hellog関連のカスタムコマンドを実行します。")
     hellog_subparsers = parser_hellog.add_subparsers(dest="hellog_command", required=True)
@@ -110,6 +173,13 @@ def main():
     parser_hellog.set_defaults(func=run_custom_hellog_command)
 
     args = parser.parse_args()
+
+    # 設定の誤りは、どのコマンドでも処理を始める前に報告して終了する
+    try:
+        load_config()
+    except ConfigError as e:
+        print(f"!!! エラー: {e}")
+        sys.exit(1)
     args.func(args)
 
 if __name__ == "__main__":
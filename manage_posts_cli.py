@@ -1,26 +1,19 @@
-import sqlite3
-import json
-from datetime import datetime, timedelta, timezone  # ★ timezone 追加
-from screenshot_util import take_screenshot
+from datetime import datetime, timedelta
 import os
 import tempfile
 import subprocess
 
-# ★ 追加: タイムゾーン（Python 3.9+ 標準）
-from zoneinfo import ZoneInfo
-
-def load_config():
-    """設定ファイルを読み込む"""
-    with open('config.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+from setup_database import create_tables
+from db_util import connect
+from config_util import load_config
+# 日時の解釈・表示は datetime_util に集約（ZoneInfo もそちらでキャッシュ）
+from datetime_util import (
+    get_zone, isoformat_utc, parse_local_datetime, pretty_in_tz, epoch_days_ago, now_utc
+)
 
 def get_db_connection():
     """設定ファイルからDBパスを読み込み、接続を返す"""
-    config = load_config()
-    db_path = config.get('database_path', 'content.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return connect()
 
 # ★ 追加: TZ設定の取得（config.json で上書き可能）
 def get_tz_prefs():
@@ -30,49 +23,6 @@ def get_tz_prefs():
     preview_tz = sched.get("preview_tz", "Pacific/Auckland")  # NZ 既定
     return input_tz, preview_tz
 
-# ★ 追加: UTC ISO8601（...Z 統一）
-def isoformat_utc(dt: datetime) -> str:
-    dt_utc = dt.astimezone(timezone.utc).replace(microsecond=0)
-    return dt_utc.isoformat().replace("+00:00", "Z")
-
-# ★ 追加: “UTC っぽい文字列”を tz-aware datetime に（Z/オフセット/なし対応）
-def parse_utcish(iso_str: str) -> datetime:
-    if not iso_str:
-        return None
-    s = iso_str.replace("Z", "+00:00")
-    try:
-        dt = datetime.fromisoformat(s)
-    except Exception:
-        return None
-    if dt.tzinfo is None:  # tzなしはUTCとみなす（過去データ救済）
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt
-
-# ★ 追加: 'YYYY-MM-DD [HH:MM[:SS]]' を input_tz で tz-aware に
-def parse_local_datetime(s: str, tz_name: str) -> datetime:
-    s = s.strip().replace("T", " ")
-    fmts = ["%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]
-    tz = ZoneInfo(tz_name)
-    last_err = None
-    for fmt in fmts:
-        try:
-            naive = datetime.strptime(s, fmt)
-            # 日付のみのときは 09:00 を既定に（必要なら変更）
-            if fmt == "%Y-%m-%d":
-                naive = naive.replace(hour=9, minute=0, second=0)
-            return naive.replace(tzinfo=tz)
-        except Exception as e:
-            last_err = e
-    raise ValueError(f"日時の解釈に失敗: '{s}' (tz={tz_name}) / {last_err}")
-
-# ★ 追加: UTC文字列を任意TZの見やすい表記へ
-def pretty_in_tz(iso_utc: str, tz_name: str) -> str:
-    dt = parse_utcish(iso_utc)
-    if not dt:
-        return "-"
-    local = dt.astimezone(ZoneInfo(tz_name))
-    return local.strftime("%Y-%m-%d %H:%M (%Z)")
-
 def _edit_text_in_editor(initial_content=""):
     """
     一時ファイルを作成し、外部エディタで編集させ、その結果を返す。
@@ -106,9 +56,6 @@ def _edit_text_in_editor(initial_content=""):
     
     return edited_content
 
-from datetime import datetime, timedelta, timezone  # 既に取り込み済みのはず
-# from zoneinfo import ZoneInfo  # 既に取り込み済みのはず
-
 def list_posts(conn, status_filter='draft', recent_days=None, media_id=None, preview_tz_override=None):
     """
     投稿を一覧表示する（拡張版）
@@ -134,10 +81,9 @@ def list_posts(conn, status_filter='draft', recent_days=None, media_id=None, pre
         params.append(media_id)
 
     if recent_days is not None:
-        # 直近N日：scheduled_at があるものを対象（NULLは除外）
-        cutoff_iso = isoformat_utc(datetime.now(timezone.utc) - timedelta(days=recent_days))
-        where_clauses.append("scheduled_at IS NOT NULL AND scheduled_at >= ?")
-        params.append(cutoff_iso)
+        # 直近N日：scheduled_at があるものを対象（NULLは除外）。整数の索引で範囲検索する
+        where_clauses.append("scheduled_epoch >= ?")
+        params.append(epoch_days_ago(recent_days))
 
     where_sql = ("WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
 
@@ -145,7 +91,7 @@ def list_posts(conn, status_filter='draft', recent_days=None, media_id=None, pre
         SELECT id, media_id, status, scheduled_at
           FROM posts
           {where_sql}
-         ORDER BY COALESCE(scheduled_at, '9999-12-31T23:59:59Z') ASC, id ASC
+         ORDER BY scheduled_epoch IS NULL, scheduled_epoch ASC, id ASC
     """
     rows = conn.execute(query, params).fetchall()
 
@@ -229,7 +175,7 @@ def new_post(conn):
         return
 
     # ★ 変更: 予約時刻の既定は「今から1時間後（UTC）」に統一
-    scheduled_at = isoformat_utc(datetime.now(timezone.utc) + timedelta(hours=1))
+    scheduled_at = isoformat_utc(now_utc() + timedelta(hours=1))
 
     cursor = conn.cursor()
     cursor.execute("INSERT INTO posts (media_id, status, scheduled_at) VALUES (?, 'draft', ?)", (media_id, scheduled_at))
@@ -344,7 +290,7 @@ def set_schedule(conn, post_id):
     time_str = input("> ").strip()
     
     # 入力TZの現在時刻
-    now_local = datetime.now(ZoneInfo(input_tz))
+    now_local = datetime.now(get_zone(input_tz))
     scheduled_dt_local = None
 
     if time_str == 'now':
@@ -424,7 +370,7 @@ def manage_image(conn, post_id, thread_order=None):
     # この投稿の元リンク（自動スクショ用）。無い場合もある（手動投稿など）
     row = conn.execute(
         """
-        SELECT c.link
+        SELECT c.link, c.title, c.published_date, p.media_id
           FROM posts p
      LEFT JOIN content c ON c.unique_id = p.content_unique_id
          WHERE p.id = ?
@@ -443,6 +389,9 @@ def manage_image(conn, post_id, thread_order=None):
     print("  2. ファイルパスを手動で指定して添付")
     print("  3. 添付画像を削除")
     menu_idx.extend(["2", "3"])
+    if row and row["title"]:
+        print("  4. カード画像を生成して添付（タイトル・メディア名・日付）")
+        menu_idx.append("4")
 
     choice = input("> ").strip()
     if choice not in menu_idx:
@@ -462,6 +411,14 @@ def manage_image(conn, post_id, thread_order=None):
         new_image_path = path
     elif choice == "3":
         new_image_path = ""
+    elif choice == "4":
+        from card_renderer import render_card
+        config = load_config()
+        media_info = config.get('media_templates', {}).get(row["media_id"], {})
+        new_image_path = render_card(row["media_id"], media_info, row["title"],
+                                     row["published_date"], config.get('card_settings'))
+        if not new_image_path:
+            return
 
     conn.execute(
         "UPDATE post_threads SET image_path = ? WHERE id = ?",
@@ -479,6 +436,7 @@ def approve_post(conn, post_id):
 def main():
     """対話形式で投稿を管理するメインループ"""
     conn = get_db_connection()
+    create_tables(conn)  # scheduled_epoch などが未作成の古いDBにも対応
     list_posts(conn)
 
     while True:
@@ -1,33 +1,21 @@
 # normalize_scheduled_at.py
-import sqlite3, json
-from datetime import datetime, timezone
+# posts.scheduled_at を UTC の ISO8601（…Z）にそろえる。
+# scheduled_epoch はトリガーで scheduled_at と同期するため、ここでは触らない。
+from setup_database import create_tables
+from db_util import connect
+from datetime_util import parse_utcish, isoformat_utc
 
-def parse_utcish(s):
-    if not s:
-        return None
-    s = s.replace("Z", "+00:00")
-    dt = datetime.fromisoformat(s)
-    if dt.tzinfo is None:
-        # naive は UTC とみなして救済
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt
-
-def iso_utc(dt):
-    return dt.astimezone(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00","Z")
-
-conn = sqlite3.connect("content.db")
+conn = connect("content.db")
+create_tables(conn)
 rows = conn.execute("SELECT id, scheduled_at FROM posts WHERE scheduled_at IS NOT NULL").fetchall()
 fixed = 0
 for _id, s in rows:
-    try:
-        dt = parse_utcish(s)
-        if dt:
-            norm = iso_utc(dt)
-            if norm != s:
-                conn.execute("UPDATE posts SET scheduled_at = ? WHERE id = ?", (norm, _id))
-                fixed += 1
-    except Exception:
-        # 破損データ等はスキップ or ログ
-        pass
+    dt = parse_utcish(s)
+    if dt:
+        norm = isoformat_utc(dt)
+        if norm != s:
+            conn.execute("UPDATE posts SET scheduled_at = ? WHERE id = ?", (norm, _id))
+            fixed += 1
+    # 解釈できない破損データはスキップ
 conn.commit()
 print(f"normalized: {fixed}")
@@ -1,24 +1,17 @@
-import sqlite3
-import json
 import tweepy
-from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
+from screenshot_postprocess import select_upload_image
+from setup_database import create_tables
+from datetime_util import now_utc, to_epoch
+from db_util import connect
+from config_util import load_config
 
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
-def load_config():
-    """設定ファイルを読み込む"""
-    with open('config.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
-
 def get_db_connection():
-    config = load_config()
-    db_path = config.get('database_path', 'content.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return connect()
 
 def update_post_status(conn, post_id, status, error_message=None):
     """投稿のステータスを更新する"""
@@ -38,10 +31,6 @@ def post_scheduled_tweets():
         print("エラー: .envファイルにXのAPI認証情報が正しく設定されていません。")
         return
 
-def now_utc_iso():
-    # 常に UTC の ISO8601（…Z）で秒精度、DBと同じ形
-    return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
-
     try:
         # ★ 修正点: 環境変数から取得したキーを使用
         # Tweepy v2 (OAuth 1.0a)
@@ -65,17 +54,18 @@ def now_utc_iso():
         return
 
     conn = get_db_connection()
-    now_utc_iso()
+    create_tables(conn)  # scheduled_epoch などが未作成の古いDBにも対応
+    now_epoch = to_epoch(now_utc())
+    postprocess_settings = load_config().get('screenshot_settings', {}).get('postprocess', {})
 
     # 投稿すべき投稿を取得
     posts_to_send = conn.execute("""
         SELECT id
           FROM posts
          WHERE status = 'approved'
-           AND scheduled_at IS NOT NULL
-           AND scheduled_at <= ?
-      ORDER BY scheduled_at
-    """, (now,)).fetchall()
+           AND scheduled_epoch <= ?
+      ORDER BY scheduled_epoch
+    """, (now_epoch,)).fetchall()
 
     if not posts_to_send:
         print("現在投稿すべきツイートはありません。")
@@ -102,8 +92,10 @@ def now_utc_iso():
                 # 画像がある場合はアップロード
                 if image_path and os.path.exists(image_path):
                     try:
-                        print(f"  > 画像をアップロード中: {image_path}")
-                        media = api_v1.media_upload(filename=image_path)
+                        # スクリーンショットは X の制限を満たす最も小さい派生画像 (JPEG/WebP) を使う
+                        upload_path = select_upload_image(image_path, postprocess_settings)
+                        print(f"  > 画像をアップロード中: {upload_path} ({os.path.getsize(upload_path) // 1024} KB)")
+                        media = api_v1.media_upload(filename=upload_path)
                         media_ids.append(media.media_id_string)
                         print(f"  > 画像アップロード成功 (Media ID: {media.media_id_string})")
                     except Exception as e:
@@ -10,7 +10,6 @@ Standalone custom-commands runner.
 """
 import os
 import sys
-import json
 import shlex
 import argparse
 import subprocess
@@ -18,13 +17,17 @@ from pathlib import Path
 from datetime import datetime, timezone
 from typing import Dict, Any, List
 
+import config_util
+
 # ====== Config ======
 DEFAULT_CONFIG = "config.json"
 
 # ====== Utils ======
 def load_config(path: str = DEFAULT_CONFIG) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    try:
+        return config_util.load_config(path)
+    except config_util.ConfigError as e:
+        raise SystemExit(str(e))
 
 def parse_arg_kv(items: List[str]) -> Dict[str, str]:
     out = {}
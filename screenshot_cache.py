@@ -0,0 +1,202 @@
+"""
+screenshots/ ディレクトリのキャッシュ索引。
+
+撮影済みのスクリーンショットを screenshot_cache テーブルに slug ごとに記録し
+（URL・バイト数・撮影日時・最終利用日時）、
+- キャッシュの有無は os.path.exists ではなく索引への1回の問い合わせで判定する
+- ttl_days より古いものは撮り直す
+- 合計サイズが max_megabytes を超えたら、最後に使われたのが古い順に削除する
+  （まだ投稿されていない下書きが添付している画像は削除しない）
+"""
+import os
+from datetime import datetime, timezone
+
+from setup_database import create_tables
+from screenshot_postprocess import variant_paths
+from db_util import connect
+from config_util import load_config
+
+DEFAULT_CACHE_SETTINGS = {
+    "max_megabytes": 500,
+    "ttl_days": 30,
+}
+
+def get_db_connection():
+    return connect()
+
+def _files_for(image_path):
+    """元画像と、後処理で作られる派生画像 (*.x.jpg / *.x.webp) のパス"""
+    return [image_path] + variant_paths(image_path)
+
+def _total_size(image_path):
+    return sum(os.path.getsize(path) for path in _files_for(image_path) if os.path.exists(path))
+
+def _slug_from_path(image_path):
+    return os.path.splitext(os.path.basename(image_path))[0]
+
+
+class ScreenshotCache:
+    """
+    screenshot_cache テーブルを使ったスクリーンショットのキャッシュ。
+    conn を渡さなければ config.json の database_path に接続し、close() で閉じる。
+    """
+
+    def __init__(self, conn=None, settings=None):
+        if settings is None:
+            settings = load_config().get('screenshot_settings', {}).get('cache', {})
+        merged = dict(DEFAULT_CACHE_SETTINGS)
+        merged.update(settings)
+        self.max_bytes = int(merged["max_megabytes"] * 1024 * 1024)
+        self.ttl_days = merged["ttl_days"]
+
+        self._owns_conn = conn is None
+        self.conn = get_db_connection() if conn is None else conn
+        create_tables(self.conn)
+
+    def close(self):
+        if self._owns_conn and self.conn is not None:
+            self.conn.close()
+        self.conn = None
+
+    def lookup(self, slug, image_path):
+        """
+        TTL 内の撮影済み画像があればパスを返し、最終利用日時を更新する。
+        索引に無いが既にファイルがある場合（索引を作る前に撮ったもの）は、その場で索引に加える。
+        """
+        with self.conn:
+            row = self.conn.execute("""
+                SELECT image_path FROM screenshot_cache
+                 WHERE slug = ? AND captured_at >= datetime('now', ?)
+            """, (slug, f"-{self.ttl_days} days")).fetchone()
+            if row:
+                if not os.path.exists(row['image_path']):
+                    # 手動で消されたファイルは索引からも外す
+                    self.conn.execute("DELETE FROM screenshot_cache WHERE slug = ?", (slug,))
+                    return None
+                self.conn.execute("""
+                    UPDATE screenshot_cache SET last_used_at = CURRENT_TIMESTAMP WHERE slug = ?
+                """, (slug,))
+                print(f"キャッシュが見つかりました。既存のファイルを使用します: {row['image_path']}")
+                return row['image_path']
+
+            known = self.conn.execute(
+                "SELECT 1 FROM screenshot_cache WHERE slug = ?", (slug,)
+            ).fetchone()
+        if known or not os.path.exists(image_path):
+            return None  # 期限切れ、または未撮影
+
+        captured_at = datetime.fromtimestamp(os.path.getmtime(image_path), timezone.utc)
+        if (datetime.now(timezone.utc) - captured_at).days >= self.ttl_days:
+            return None
+        self._upsert(slug, None, image_path, captured_at.strftime('%Y-%m-%d %H:%M:%S'))
+        print(f"キャッシュが見つかりました。既存のファイルを使用します: {image_path}")
+        return image_path
+
+    def _upsert(self, slug, url, image_path, captured_at=None):
+        with self.conn:
+            self.conn.execute("""
+                INSERT INTO screenshot_cache (slug, url, image_path, byte_size, captured_at, last_used_at)
+                VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), CURRENT_TIMESTAMP)
+                ON CONFLICT(slug) DO UPDATE SET
+                    url = COALESCE(excluded.url, screenshot_cache.url),
+                    image_path = excluded.image_path,
+                    byte_size = excluded.byte_size,
+                    captured_at = excluded.captured_at,
+                    last_used_at = excluded.last_used_at
+            """, (slug, url, image_path, _total_size(image_path), captured_at))
+
+    def record(self, slug, url, image_path):
+        """撮影したばかりの画像を索引に記録し、上限を超えていれば古いものを削除する"""
+        self._upsert(slug, url, image_path)
+        self.evict(keep=slug)
+
+    def update_size(self, image_path):
+        """派生画像を作った後などに、記録しているバイト数を実際のファイルに合わせる"""
+        slug = _slug_from_path(image_path)
+        with self.conn:
+            self.conn.execute("""
+                UPDATE screenshot_cache SET byte_size = ? WHERE slug = ?
+            """, (_total_size(image_path), slug))
+        self.evict(keep=slug)
+
+    def total_bytes(self):
+        return self.conn.execute(
+            "SELECT COALESCE(SUM(byte_size), 0) FROM screenshot_cache"
+        ).fetchone()[0]
+
+    def evict(self, keep=None):
+        """
+        合計サイズが max_bytes 以下になるまで、最終利用日時の古い順に画像を削除する。
+        まだ投稿されていない (status が posted 以外の) 投稿が添付している画像と、
+        keep に指定した slug（撮影したばかりの画像）は残す。削除した件数を返す。
+        """
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+
+        candidates = self.conn.execute("""
+            SELECT slug, image_path, byte_size FROM screenshot_cache
+             WHERE slug != COALESCE(?, '')
+               AND image_path NOT IN (
+                    SELECT pt.image_path FROM post_threads pt
+                      JOIN posts p ON p.id = pt.post_id
+                     WHERE p.status != 'posted' AND pt.image_path IS NOT NULL)
+          ORDER BY last_used_at, slug
+        """, (keep,)).fetchall()
+
+        evicted = []
+        for row in candidates:
+            if total <= self.max_bytes:
+                break
+            for path in _files_for(row['image_path']):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"警告: キャッシュ画像を削除できませんでした ({path}) - {e}")
+            evicted.append(row['slug'])
+            total -= row['byte_size']
+
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM screenshot_cache WHERE slug = ?", [(slug,) for slug in evicted]
+            )
+        if evicted:
+            print(f"スクリーンショットのキャッシュから{len(evicted)}件を削除しました "
+                  f"(合計 {total / 1024 / 1024:.1f} MB / 上限 {self.max_bytes / 1024 / 1024:.0f} MB)。")
+        return len(evicted)
+
+
+def prune_screenshot_cache(output_dir='screenshots'):
+    """
+    screenshots/ にあって索引に無い画像を取り込んだうえで、上限を超えた分を削除する。
+    索引を導入する前に撮った画像もこれでサイズ上限の対象になる。
+    """
+    cache = ScreenshotCache()
+    if os.path.isdir(output_dir):
+        indexed = {row['slug'] for row in cache.conn.execute("SELECT slug FROM screenshot_cache")}
+        adopted = 0
+        for entry in os.scandir(output_dir):
+            if not entry.is_file() or not entry.name.endswith('.png'):
+                continue
+            slug = _slug_from_path(entry.name)
+            if slug in indexed:
+                continue
+            captured_at = datetime.fromtimestamp(entry.stat().st_mtime, timezone.utc)
+            cache._upsert(slug, None, entry.path, captured_at.strftime('%Y-%m-%d %H:%M:%S'))
+            adopted += 1
+        if adopted:
+            print(f"索引に無かった{adopted}件の画像を取り込みました。")
+
+    evicted = cache.evict()
+    count, total = cache.conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(byte_size), 0) FROM screenshot_cache"
+    ).fetchone()
+    cache.close()
+    print(f"スクリーンショットのキャッシュ: {count}件, {total / 1024 / 1024:.1f} MB "
+          f"(上限 {cache.max_bytes / 1024 / 1024:.0f} MB, 今回の削除 {evicted}件)")
+
+
+if __name__ == '__main__':
+    prune_screenshot_cache()
@@ -0,0 +1,140 @@
+"""
+スクリーンショットの後処理（切り抜き・縮小・JPEG/WebP への再エンコード）。
+
+Playwright のフルページ PNG は縦に数千ピクセル、数MBになることがあり、
+そのまま X にアップロードすると転送量も時間もかかる。
+ここでは元画像の隣に、上部だけを切り抜いて縮小し、サイズ上限内に収めた
+JPEG / WebP の派生画像を作り、投稿時には X の制限を満たす最も小さいものを選ぶ。
+
+Pillow が無い環境では派生画像を作らず、元画像をそのまま使う。
+"""
+import io
+import os
+
+# Pillow は任意（無ければ後処理をスキップ）。post-now などの起動を遅くしないよう、
+# 派生画像を作るときに _import_pillow() で初めてインポートする
+Image = None
+
+# X (media/upload) の画像の制限
+X_IMAGE_MAX_BYTES = 5 * 1024 * 1024
+X_IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.gif'}
+
+# config.json の screenshot_settings.postprocess で上書きできる
+DEFAULT_POSTPROCESS_SETTINGS = {
+    "crop_width": 1280,        # 左上からこの幅・高さで切り抜く（ビューポート相当）
+    "crop_height": 1600,
+    "max_width": 1200,         # これより大きければ縮小する
+    "formats": ["jpeg", "webp"],
+    "max_bytes": 1024 * 1024,  # 派生画像ごとの目標サイズ
+    "quality_steps": [85, 75, 65, 55, 45],
+}
+
+_FORMAT_EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp"}
+
+
+def _settings(settings):
+    merged = dict(DEFAULT_POSTPROCESS_SETTINGS)
+    merged.update(settings or {})
+    return merged
+
+
+def variant_path(image_path, fmt):
+    """元画像に対応する派生画像のパス（例: screenshots/hellog_2025-10-23-1.x.jpg）"""
+    base, _ = os.path.splitext(image_path)
+    return f"{base}.x{_FORMAT_EXTENSIONS[fmt]}"
+
+
+def variant_paths(image_path):
+    """元画像に対応しうるすべての派生画像のパス（作られていないものも含む）"""
+    return [variant_path(image_path, fmt) for fmt in _FORMAT_EXTENSIONS]
+
+
+def _is_fresh(path, source_path):
+    """派生画像が存在し、元画像より新しければ作り直さない"""
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source_path)
+
+
+def _encode_within(image, fmt, max_bytes, quality_steps):
+    """品質を段階的に下げながら、max_bytes 以下に収まった最初のエンコード結果を返す"""
+    data = None
+    for quality in quality_steps:
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt.upper(), quality=quality, optimize=True)
+        data = buffer.getvalue()
+        if len(data) <= max_bytes:
+            break
+    return data  # 最低品質でも収まらなければ最後の結果を返す（X の上限は別途判定）
+
+
+def _import_pillow():
+    """Pillow を読み込む。使えなければ False"""
+    global Image
+    if Image is None:
+        try:
+            from PIL import Image
+        except ImportError:
+            return False
+    return True
+
+
+def create_variants(image_path, settings=None):
+    """
+    元画像から切り抜き・縮小・再エンコードした派生画像を作り、パスのリストを返す。
+    既に最新の派生画像があれば作り直さない。
+    """
+    if not image_path or not os.path.exists(image_path) or not _import_pillow():
+        return []
+    settings = _settings(settings)
+    formats = [fmt for fmt in settings["formats"] if fmt in _FORMAT_EXTENSIONS]
+
+    targets = {fmt: variant_path(image_path, fmt) for fmt in formats}
+    pending = {fmt: path for fmt, path in targets.items() if not _is_fresh(path, image_path)}
+    if pending:
+        with Image.open(image_path) as original:
+            image = original.convert("RGB")
+        width, height = image.size
+        image = image.crop((0, 0, min(width, settings["crop_width"]), min(height, settings["crop_height"])))
+        if image.width > settings["max_width"]:
+            new_height = round(image.height * settings["max_width"] / image.width)
+            image = image.resize((settings["max_width"], new_height), Image.LANCZOS)
+
+        for fmt, path in pending.items():
+            data = _encode_within(image, fmt, settings["max_bytes"], settings["quality_steps"])
+            # 書き込みの途中で失敗しても、壊れた派生画像が最新のものとして残らないようにする
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            print(f"  > 派生画像を作成しました: {path} ({len(data) // 1024} KB)")
+
+    return list(targets.values())
+
+
+def _meets_x_limits(path):
+    ext = os.path.splitext(path)[1].lower()
+    return ext in X_IMAGE_EXTENSIONS and os.path.getsize(path) <= X_IMAGE_MAX_BYTES
+
+
+def _is_screenshot(image_path, screenshot_dir):
+    """自動撮影したスクリーンショット（screenshot_dir 内のファイル）かを判定する"""
+    directory = os.path.abspath(screenshot_dir)
+    return os.path.abspath(image_path).startswith(directory + os.sep)
+
+
+def select_upload_image(image_path, settings=None, screenshot_dir='screenshots'):
+    """
+    X にアップロードする画像を選ぶ。
+    スクリーンショットの場合は元画像と派生画像（無ければここで作る）のうち、
+    X の制限を満たす最も小さいファイルを返す。手動で指定した画像は加工せずそのまま返す。
+    どれも制限を満たさなければ元画像をそのまま返す（アップロード側でエラーになる）。
+    """
+    if not image_path or not os.path.exists(image_path):
+        return image_path
+    if not _is_screenshot(image_path, screenshot_dir):
+        return image_path
+
+    candidates = [image_path] + create_variants(image_path, settings)
+    acceptable = [path for path in candidates if os.path.exists(path) and _meets_x_limits(path)]
+    if not acceptable:
+        return image_path
+    return min(acceptable, key=os.path.getsize)
@@ -0,0 +1,181 @@
+import asyncio
+
+from setup_database import create_tables
+from db_util import connect
+from config_util import load_config
+
+# 'running' のまま放置されたジョブ（ワーカーの異常終了など）を再実行対象に戻すまでの時間
+STALE_RUNNING_MINUTES = 30
+
+def get_db_connection():
+    return connect()
+
+def enqueue_screenshot(cursor, post_thread_id, url):
+    """
+    スクリーンショット撮影ジョブを積む。
+    呼び出し側のトランザクション内で実行されるため、ここでは commit しない。
+    """
+    cursor.execute("""
+        INSERT INTO screenshot_jobs (post_thread_id, url, status)
+        VALUES (?, ?, 'pending')
+    """, (post_thread_id, url))
+    print(f"  > スクリーンショット撮影ジョブを登録しました: {url}")
+
+def claim_jobs(conn, limit, max_attempts):
+    """
+    実行待ちのジョブを最大 limit 件取り出して 'running' にする。
+    長時間 'running' のまま残っているジョブも再実行対象に含め、そのうち既に上限回数まで
+    試したものは同じトランザクションで 'error' にする（'running' のまま残り続けないように）。
+    """
+    with conn:
+        gave_up = conn.execute(f"""
+            UPDATE screenshot_jobs
+               SET status = 'error', error_message = ?, updated_at = CURRENT_TIMESTAMP
+             WHERE status = 'running'
+               AND attempts >= ?
+               AND updated_at < datetime('now', '-{STALE_RUNNING_MINUTES} minutes')
+        """, ("撮影中にワーカーが終了し、上限回数に達しました", max_attempts)).rowcount
+        if gave_up:
+            print(f"  > 'running' のまま上限回数に達していた{gave_up}件のジョブを error にしました。")
+        rows = conn.execute(f"""
+            SELECT id, post_thread_id, url, attempts
+              FROM screenshot_jobs
+             WHERE attempts < ?
+               AND (status = 'pending'
+                    OR (status = 'running'
+                        AND updated_at < datetime('now', '-{STALE_RUNNING_MINUTES} minutes')))
+          ORDER BY id
+             LIMIT ?
+        """, (max_attempts, limit)).fetchall()
+        for row in rows:
+            conn.execute("""
+                UPDATE screenshot_jobs
+                   SET status = 'running', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+                 WHERE id = ?
+            """, (row['id'],))
+    return rows
+
+def complete_job(conn, job, image_path, max_attempts):
+    """
+    ジョブの結果を記録する。成功した場合は下書きの post_threads.image_path を埋める
+    （その間に手動で画像が設定されていれば上書きしない）。
+    """
+    with conn:
+        if image_path:
+            conn.execute("""
+                UPDATE screenshot_jobs
+                   SET status = 'done', image_path = ?, error_message = NULL, updated_at = CURRENT_TIMESTAMP
+                 WHERE id = ?
+            """, (image_path, job['id']))
+            conn.execute("""
+                UPDATE post_threads SET image_path = ?
+                 WHERE id = ? AND image_path IS NULL
+            """, (image_path, job['post_thread_id']))
+        else:
+            # 上限回数までは pending に戻して次回のワーカー実行で再試行する
+            next_status = 'error' if job['attempts'] + 1 >= max_attempts else 'pending'
+            conn.execute("""
+                UPDATE screenshot_jobs
+                   SET status = ?, error_message = ?, updated_at = CURRENT_TIMESTAMP
+                 WHERE id = ?
+            """, (next_status, "スクリーンショットの撮影に失敗しました", job['id']))
+
+async def _work_async(conn, concurrency, limit, max_attempts, postprocess_settings=None):
+    """
+    1つのブラウザを起動したまま、ジョブを取り出しては最大 concurrency ページで並行に撮影する。
+    ジョブの取り出しと結果の書き込みはイベントループのスレッドで順に行う。
+    """
+    # Playwright は撮影するときだけ読み込む
+    from screenshot_util import AsyncBrowserPool
+    from screenshot_postprocess import create_variants
+    from screenshot_cache import ScreenshotCache
+
+    def next_batch(processed):
+        batch_size = concurrency * 2
+        if limit is not None:
+            batch_size = min(batch_size, limit - processed)
+        return claim_jobs(conn, batch_size, max_attempts) if batch_size > 0 else []
+
+    processed = 0
+    succeeded = 0
+    jobs = next_batch(processed)
+    if not jobs:
+        return processed, succeeded  # 仕事がなければブラウザも起動しない
+
+    # キャッシュ索引はジョブと同じ接続で更新する
+    cache = ScreenshotCache(conn)
+    async with AsyncBrowserPool(concurrency=concurrency, cache=cache) as pool:
+        async def run(job):
+            try:
+                return job, await pool.capture(job['url'])
+            except Exception as e:
+                print(f"!!! ジョブ {job['id']} の撮影中にエラーが発生しました: {e}")
+                return job, None
+
+        while jobs:
+            for finished in asyncio.as_completed([run(job) for job in jobs]):
+                job, image_path = await finished
+                complete_job(conn, job, image_path, max_attempts)
+                processed += 1
+                if image_path:
+                    succeeded += 1
+                    print(f"ジョブ {job['id']}: 完了 (post_thread_id={job['post_thread_id']}, {image_path})")
+                    # 投稿時に待たされないよう、アップロード用の派生画像もここで作っておく
+                    # （失敗してもジョブは完了済みで、投稿時は元画像を使う。残りのジョブは続ける）
+                    try:
+                        create_variants(image_path, postprocess_settings)
+                        cache.update_size(image_path)
+                    except Exception as e:
+                        print(f"!!! ジョブ {job['id']} の派生画像の作成に失敗しました: {e}")
+                else:
+                    print(f"ジョブ {job['id']}: 失敗 (試行 {job['attempts'] + 1}/{max_attempts})")
+            jobs = next_batch(processed)
+
+    return processed, succeeded
+
+def work_screenshot_jobs(workers=None, limit=None):
+    """
+    実行待ちのスクリーンショットジョブを処理する。
+    ブラウザは1つだけ起動し、workers 枚までのページで並行に撮影する。
+    """
+    config = load_config()
+    settings = config.get('screenshot_settings', {})
+    workers = max(1, workers or settings.get('workers', 2))
+    max_attempts = settings.get('max_attempts', 3)
+
+    conn = get_db_connection()
+    create_tables(conn)
+    processed, succeeded = asyncio.run(
+        _work_async(conn, workers, limit, max_attempts, settings.get('postprocess'))
+    )
+    conn.close()
+
+    if processed == 0:
+        print("実行待ちのスクリーンショットジョブはありません。")
+    else:
+        print(f"\n{processed}件のジョブを処理しました (成功: {succeeded}件)。")
+
+def show_screenshot_jobs():
+    """スクリーンショットジョブの状態を集計して表示する"""
+    conn = get_db_connection()
+    create_tables(conn)
+    rows = conn.execute("""
+        SELECT status, COUNT(*) AS count FROM screenshot_jobs GROUP BY status ORDER BY status
+    """).fetchall()
+    print("\n--- スクリーンショットジョブ ---")
+    if not rows:
+        print("ジョブはありません。")
+    for row in rows:
+        print(f"  {row['status']:<8}: {row['count']}件")
+
+    errors = conn.execute("""
+        SELECT id, url, attempts, error_message FROM screenshot_jobs
+         WHERE status = 'error' ORDER BY id DESC LIMIT 10
+    """).fetchall()
+    for row in errors:
+        print(f"  [error] ID:{row['id']} {row['url']} (試行 {row['attempts']}回) {row['error_message'] or ''}")
+    conn.close()
+
+
+if __name__ == '__main__':
+    work_screenshot_jobs()
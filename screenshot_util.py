@@ -1,8 +1,13 @@
 import os
 import re
+import json
+import asyncio
 import hashlib
 from datetime import datetime
+from urllib.parse import urlparse
 from playwright.sync_api import sync_playwright, Error as PlaywrightError
+from screenshot_cache import ScreenshotCache
+from config_util import load_config
 
 def _slug_from_url(url: str) -> str:
     """
@@ -31,81 +36,336 @@ def _slug_from_url(url: str) -> str:
     return "site_" + hashlib.md5(url.encode("utf-8")).hexdigest()[:10]
 
 
-def take_screenshot(url, output_dir='screenshots'):
+LAUNCH_ARGS = ["--no-sandbox", "--disable-setuid-sandbox", "--disable-gpu"]
+VIEWPORT = {'width': 1280, 'height': 800}
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# config.json の screenshot_settings.profiles に何も無い場合の既定プロファイル（従来の待ち方）
+DEFAULT_CAPTURE_PROFILE = {
+    "wait_until": "networkidle",
+    "ready_selector": None,
+    "settle_ms": 3000,
+    "block_resource_types": [],
+    "block_url_patterns": [],
+    "cookie_selectors": [
+        "text=/同意|Accept|OK|承認/i",
+        "button:has-text('同意')",
+        "button:has-text('Accept all')",
+    ],
+    "cookie_timeout_ms": 1000,
+}
+
+
+def load_capture_profiles():
+    """config.json の screenshot_settings.profiles を読み込む（読めなければ空）"""
+    try:
+        return load_config().get('screenshot_settings', {}).get('profiles', {})
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f"警告: config.json から撮影プロファイルを読み込めませんでした - {e}")
+        return {}
+
+
+def get_capture_profile(url, profiles):
     """
-    指定されたURLのフルページスクリーンショットを撮影し、ファイルパスを返す（同期API版）。
+    URL のホスト名に対応する撮影プロファイルを返す。
+    profiles["default"] と、ホスト名が一致（またはそのサブドメイン）のプロファイルを
+    DEFAULT_CAPTURE_PROFILE に順に重ねたものになる。
     """
-    if not url:
-        return None
+    profile = dict(DEFAULT_CAPTURE_PROFILE)
+    profile.update(profiles.get("default", {}))
 
-    print(f"\n--- スクリーンショット処理開始: {url} ---")
+    host = (urlparse(url).hostname or "").lower()
+    matches = [
+        domain for domain in profiles
+        if domain != "default" and (host == domain or host.endswith("." + domain))
+    ]
+    if matches:
+        # より具体的な（長い）ドメイン指定を優先する
+        profile.update(profiles[max(matches, key=len)])
+    return profile
+
+
+def _should_block(request, profile):
+    """広告・解析・フォント・動画など、撮影に不要なリクエストかを判定する"""
+    if request.resource_type in profile["block_resource_types"]:
+        return True
+    return any(pattern in request.url for pattern in profile["block_url_patterns"])
+
+
+def _screenshot_path(url, output_dir):
+    """URL に対応する保存先パスを返す（ディレクトリは作成しておく）"""
     os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, f"{_slug_from_url(url)}.png")
 
-    slug = _slug_from_url(url)
-    filename = f"{slug}.png"
-    filepath = os.path.join(output_dir, filename)
-    
-    if os.path.exists(filepath):
-        print(f"キャッシュが見つかりました。既存のファイルを使用します: {filepath}")
-        print("--- スクリーンショット処理完了 (キャッシュ) ---\n")
+
+def _cached_path(url, output_dir, cache):
+    """撮影済みで期限内のスクリーンショットがあればそのパスを返す（索引への問い合わせ1回）"""
+    return cache.lookup(_slug_from_url(url), _screenshot_path(url, output_dir))
+
+
+def _record_capture(url, filepath, cache):
+    """撮影した画像をキャッシュ索引に記録する（上限を超えれば古いものが削除される）"""
+    cache.record(_slug_from_url(url), url, filepath)
+
+
+def _capture_page(page, url, filepath, profile):
+    """
+    開いたページでプロファイルに従って URL を表示し、フルページを撮影する（同期API）。
+    固定の待ち時間ではなく ready_selector の表示を待ち、クッキーバナーの処理は
+    cookie_selectors が指定されたサイトでだけ行う。
+    """
+    if profile["block_resource_types"] or profile["block_url_patterns"]:
+        page.route("**/*", lambda route: route.abort() if _should_block(route.request, profile) else route.continue_())
+
+    print(f"ページにアクセス中: {url}")
+    page.goto(url, wait_until=profile["wait_until"], timeout=60000)
+    if profile["ready_selector"]:
+        page.wait_for_selector(profile["ready_selector"], state="visible", timeout=30000)
+    if profile["settle_ms"]:
+        page.wait_for_timeout(profile["settle_ms"])
+
+    if profile["cookie_selectors"]:
+        print("クッキーバナーを処理しています...")
+    for selector in profile["cookie_selectors"]:
+        button = page.locator(selector)
+        try:
+            if button.is_visible(timeout=profile["cookie_timeout_ms"]):
+                button.click()
+                print("  > 同意ボタンをクリックしました。")
+                page.wait_for_timeout(500)
+                break
+        except PlaywrightError:
+            pass # タイムアウトなどで見つからない場合は無視
+
+    print("フルページスクリーンショットを撮影中...")
+    page.screenshot(path=filepath, full_page=True, timeout=30000)
+
+
+async def _capture_page_async(page, url, filepath, profile):
+    """_capture_page の非同期API版"""
+    if profile["block_resource_types"] or profile["block_url_patterns"]:
+        async def handle_route(route):
+            if _should_block(route.request, profile):
+                await route.abort()
+            else:
+                await route.continue_()
+        await page.route("**/*", handle_route)
+
+    print(f"ページにアクセス中: {url}")
+    await page.goto(url, wait_until=profile["wait_until"], timeout=60000)
+    if profile["ready_selector"]:
+        await page.wait_for_selector(profile["ready_selector"], state="visible", timeout=30000)
+    if profile["settle_ms"]:
+        await page.wait_for_timeout(profile["settle_ms"])
+
+    for selector in profile["cookie_selectors"]:
+        button = page.locator(selector)
+        try:
+            if await button.is_visible(timeout=profile["cookie_timeout_ms"]):
+                await button.click()
+                print(f"  > 同意ボタンをクリックしました: {url}")
+                await page.wait_for_timeout(500)
+                break
+        except PlaywrightError:
+            pass
+
+    await page.screenshot(path=filepath, full_page=True, timeout=30000)
+
+
+class BrowserPool:
+    """
+    Chromium を1つ起動したまま、複数のスクリーンショットで使い回す（同期API版）。
+    with 文で使い、抜けるときにブラウザを終了する。
+    Playwright の同期APIはスレッドをまたいで使えないため、作成したスレッドでのみ使うこと。
+
+        with BrowserPool() as pool:
+            for url in urls:
+                pool.capture(url)
+    """
+
+    def __init__(self, output_dir='screenshots', profiles=None, cache=None):
+        self.output_dir = output_dir
+        self.profiles = load_capture_profiles() if profiles is None else profiles
+        self._owns_cache = cache is None
+        self.cache = ScreenshotCache() if cache is None else cache
+        self._playwright = None
+        self._browser = None
+        self._context = None
+
+    def __enter__(self):
+        print("Playwrightを起動しています (同期モード)...")
+        self._playwright = sync_playwright().start()
+        try:
+            self._browser = self._playwright.chromium.launch(args=LAUNCH_ARGS)
+            self._context = self._browser.new_context(viewport=VIEWPORT, user_agent=USER_AGENT)
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._browser:
+            self._browser.close()
+            self._browser = None
+            print("Playwrightを終了しました。")
+        if self._playwright:
+            self._playwright.stop()
+            self._playwright = None
+        if self._owns_cache:
+            self.cache.close()
+
+    def capture(self, url):
+        """URL のスクリーンショットを撮影してパスを返す。失敗した場合は None"""
+        if not url:
+            return None
+        cached = _cached_path(url, self.output_dir, self.cache)
+        if cached:
+            return cached
+
+        filepath = _screenshot_path(url, self.output_dir)
+        page = self._context.new_page()
+        try:
+            _capture_page(page, url, filepath, get_capture_profile(url, self.profiles))
+        except Exception as e:
+            print(f"!!! エラー: スクリーンショットの撮影に失敗しました ({url})")
+            print(f"詳細: {e}")
+            return None
+        finally:
+            page.close()
+
+        print(f"スクリーンショットを '{filepath}' に保存しました。")
+        _record_capture(url, filepath, self.cache)
         return filepath
 
-    print("Playwrightを起動しています (同期モード)...")
-    try:
-        with sync_playwright() as p:
-            browser = None
+
+class AsyncBrowserPool:
+    """
+    Chromium を1つ起動したまま、同時に開くページ数を concurrency に制限して
+    複数の URL を並行に撮影する（非同期API版）。
+
+        async with AsyncBrowserPool(concurrency=4) as pool:
+            paths = await pool.capture_many(urls)
+    """
+
+    def __init__(self, output_dir='screenshots', concurrency=4, profiles=None, cache=None):
+        self.output_dir = output_dir
+        self.concurrency = max(1, concurrency)
+        self.profiles = load_capture_profiles() if profiles is None else profiles
+        self._owns_cache = cache is None
+        self.cache = ScreenshotCache() if cache is None else cache
+        self._semaphore = None
+        self._playwright = None
+        self._browser = None
+        self._context = None
+
+    async def __aenter__(self):
+        from playwright.async_api import async_playwright
+        print(f"Playwrightを起動しています (非同期モード, 同時ページ数 {self.concurrency})...")
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._playwright = await async_playwright().start()
+        try:
+            self._browser = await self._playwright.chromium.launch(args=LAUNCH_ARGS)
+            self._context = await self._browser.new_context(viewport=VIEWPORT, user_agent=USER_AGENT)
+        except Exception:
+            await self.close()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._browser:
+            await self._browser.close()
+            self._browser = None
+            print("Playwrightを終了しました。")
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+        if self._owns_cache:
+            self.cache.close()
+
+    async def capture(self, url):
+        """URL のスクリーンショットを撮影してパスを返す。失敗した場合は None"""
+        if not url:
+            return None
+        cached = _cached_path(url, self.output_dir, self.cache)
+        if cached:
+            return cached
+
+        filepath = _screenshot_path(url, self.output_dir)
+        async with self._semaphore:
+            page = await self._context.new_page()
             try:
-                browser = p.chromium.launch(
-                    args=["--no-sandbox", "--disable-setuid-sandbox", "--disable-gpu"]
-                )
-                context = browser.new_context(
-                    viewport={'width': 1280, 'height': 800},
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-                )
-                page = context.new_page()
-
-                print(f"ページにアクセス中: {url}")
-                page.goto(url, wait_until="networkidle", timeout=60000)
-                page.wait_for_timeout(3000)
-
-                print("クッキーバナーを処理しています...")
-                cookie_buttons = [
-                    page.locator("text=/同意|Accept|OK|承認/i"),
-                    page.locator("button:has-text('同意')"),
-                    page.locator("button:has-text('Accept all')")
-                ]
-                for button in cookie_buttons:
-                    try:
-                        if button.is_visible(timeout=1000):
-                            button.click()
-                            print("  > 同意ボタンをクリックしました。")
-                            page.wait_for_timeout(1000)
-                            break
-                    except PlaywrightError:
-                        pass # タイムアウトなどで見つからない場合は無視
-                
-                print("フルページスクリーンショットを撮影中...")
-                page.screenshot(path=filepath, full_page=True, timeout=30000)
-
-            except PlaywrightError as e:
-                print(f"!!! Playwrightでの処理中にエラーが発生しました: {e}")
-                # エラーが発生した場合はNoneを返すために再送出
-                raise e
+                await _capture_page_async(page, url, filepath, get_capture_profile(url, self.profiles))
+            except Exception as e:
+                print(f"!!! エラー: スクリーンショットの撮影に失敗しました ({url})")
+                print(f"詳細: {e}")
+                return None
             finally:
-                if browser:
-                    browser.close()
-                    print("Playwrightを終了しました。")
+                await page.close()
 
         print(f"スクリーンショットを '{filepath}' に保存しました。")
-        print("--- スクリーンショット処理完了 ---\n")
+        _record_capture(url, filepath, self.cache)
         return filepath
 
-    except Exception as e:
-        print(f"!!! エラー: スクリーンショットの撮影中に予期せぬエラーが発生しました。")
-        print(f"詳細: {e}")
-        print("--- スクリーンショット処理失敗 ---\n")
+    async def capture_many(self, urls):
+        """複数の URL を並行に撮影し、{url: パス または None} を返す"""
+        urls = list(dict.fromkeys(urls))
+        paths = await asyncio.gather(*(self.capture(url) for url in urls))
+        return dict(zip(urls, paths))
+
+
+async def capture_many_async(urls, output_dir='screenshots', concurrency=4):
+    """1つのブラウザで複数の URL を並行に撮影し、{url: パス または None} を返す"""
+    async with AsyncBrowserPool(output_dir=output_dir, concurrency=concurrency) as pool:
+        return await pool.capture_many(urls)
+
+
+def capture_many(urls, output_dir='screenshots', concurrency=4):
+    """capture_many_async を同期コードから呼ぶためのラッパー"""
+    return asyncio.run(capture_many_async(urls, output_dir=output_dir, concurrency=concurrency))
+
+
+def take_screenshot(url, output_dir='screenshots', pool=None):
+    """
+    指定されたURLのフルページスクリーンショットを撮影し、ファイルパスを返す（同期API版）。
+    pool (BrowserPool) を渡すと起動済みのブラウザを使い回す。
+    """
+    if not url:
         return None
 
+    print(f"\n--- スクリーンショット処理開始: {url} ---")
+    cache = pool.cache if pool is not None else ScreenshotCache()
+    try:
+        cached = _cached_path(url, output_dir, cache)
+        if cached:
+            print("--- スクリーンショット処理完了 (キャッシュ) ---\n")
+            return cached
+
+        try:
+            if pool is not None:
+                filepath = pool.capture(url)
+            else:
+                with BrowserPool(output_dir=output_dir, cache=cache) as new_pool:
+                    filepath = new_pool.capture(url)
+        except Exception as e:
+            print(f"!!! エラー: スクリーンショットの撮影中に予期せぬエラーが発生しました。")
+            print(f"詳細: {e}")
+            filepath = None
+    finally:
+        if pool is None:
+            cache.close()
+
+    if filepath:
+        print("--- スクリーンショット処理完了 ---\n")
+    else:
+        print("--- スクリーンショット処理失敗 ---\n")
+    return filepath
+
 if __name__ == '__main__':
     test_url = "https://www.youtube.com/watch?v=6WmcXHbbwmM"
     print(f"テストとして '{test_url}' のスクリーンショットを撮影します。")
@@ -0,0 +1,84 @@
+"""
+共有フィードの分類処理のマイクロベンチマーク。
+
+scripts/list_heldio.tsv のタイトル（約2000件）を heldio / helwa に分類し、
+従来の方式（エントリーごとに config の dict をたどり、文字列のまま re.search する）と
+ClassificationEngine（実行ごとに1回コンパイルし、まとめて分類する）を比べる。
+結果が一致することも確認する。
+
+リポジトリのルートで実行する:
+    python scripts/bench_classification.py
+"""
+import os
+import re
+import sys
+import json
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classification_rules import ClassificationEngine
+
+TSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'list_heldio.tsv')
+REPEAT = 5
+
+
+def load_titles(path=TSV_PATH):
+    with open(path, 'r', encoding='utf-8') as f:
+        next(f)  # ヘッダー行
+        return [line.split('\t')[2] for line in f if line.count('\t') >= 2]
+
+
+def legacy_classify(entry_title, config, media_ids_sharing_feed):
+    """変更前の fetch_feeds の分類（helwa → heldio → その他の順で毎回 re.search）"""
+    def matches(media_id):
+        rules = config.get('media_templates', {}).get(media_id, {}) \
+                      .get('x_post_template', {}).get('filtering_rules', {})
+        if rules.get('include_regex') and not re.search(rules['include_regex'], entry_title):
+            return False
+        if rules.get('exclude_regex') and re.search(rules['exclude_regex'], entry_title):
+            return False
+        return True
+
+    for media_id in ['helwa', 'heldio']:
+        if media_id in media_ids_sharing_feed and matches(media_id):
+            return media_id
+    for media_id in media_ids_sharing_feed:
+        if media_id not in ['helwa', 'heldio'] and matches(media_id):
+            return media_id
+    return None
+
+
+def main():
+    with open('config.json', 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    titles = load_titles()
+    media_ids = ['heldio', 'helwa']
+
+    legacy = [legacy_classify(title, config, media_ids) for title in titles]
+    engine = ClassificationEngine.from_config(config)
+    results = engine.classify_many(titles, media_ids)
+    mismatches = sum(1 for old, new in zip(legacy, results) if old != new.media_id)
+
+    def run_legacy():
+        re.purge()  # 実行ごとに初回のコンパイルが発生する状況にそろえる
+        for title in titles:
+            legacy_classify(title, config, media_ids)
+
+    def run_engine():
+        ClassificationEngine.from_config(config).classify_many(titles, media_ids)
+
+    legacy_sec = min(timeit.repeat(run_legacy, number=1, repeat=REPEAT))
+    engine_sec = min(timeit.repeat(run_engine, number=1, repeat=REPEAT))
+
+    counts = {}
+    for result in results:
+        counts[result.media_id] = counts.get(result.media_id, 0) + 1
+    print(f"タイトル数: {len(titles)}件  分類結果: {counts}  従来方式との不一致: {mismatches}件")
+    print(f"従来方式            : {legacy_sec * 1000:8.2f} ms ({legacy_sec / len(titles) * 1e6:.2f} µs/件)")
+    print(f"ClassificationEngine: {engine_sec * 1000:8.2f} ms ({engine_sec / len(titles) * 1e6:.2f} µs/件)")
+    print(f"速度比: {legacy_sec / engine_sec:.1f}倍")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+helhub.py の起動時間（インポート時間）のベンチマーク兼回帰チェック。
+
+コマンドごとに新しい Python プロセスで helhub と、そのコマンドが実行時に読み込むモジュールを
+インポートし、かかった時間と読み込まれた重い依存ライブラリを表示する。
+比較のため、すべてのコマンドのモジュールを先に読み込む場合（遅延インポート導入前の helhub.py と
+同じ）も測る。
+
+次の場合は終了コード 1 を返す:
+  - helhub 自体のインポートで重い依存ライブラリが読み込まれた
+  - コマンドが、許可していない重い依存ライブラリを読み込んだ
+
+リポジトリのルートで実行する:
+    python scripts/bench_import_time.py
+"""
+import os
+import sys
+import json
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPEAT = 5
+
+# 起動を遅くする外部ライブラリ（トップレベルのパッケージ名）
+HEAVY_MODULES = ['playwright', 'tweepy', 'feedparser', 'requests', 'dotenv', 'PIL', 'paramiko']
+
+# コマンド → (実行時にインポートするモジュール, 読み込んでよい重い依存ライブラリ)
+COMMANDS = {
+    'init-db': ('setup_database', []),
+    'migrate': ('setup_database', []),
+    'fetch': ('fetch_feeds', ['feedparser', 'requests']),
+    'generate-js': ('generate_data_js', []),
+    'build-site': ('build_site', []),
+    'update-web': ('update_and_upload', ['feedparser', 'requests', 'dotenv']),
+    'manage-posts': ('manage_posts_cli', []),
+    'post-now': ('post_to_x', ['tweepy', 'requests', 'dotenv']),
+    'deploy': ('deploy', []),
+    'generate-news': ('generate_newsletter_summary', []),
+    'screenshots work': ('screenshot_queue', []),
+    'screenshots prune': ('screenshot_cache', []),
+}
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+print(json.dumps({{"ms": elapsed * 1000, "heavy": heavy}}))
+"""
+
+
+def probe(modules):
+    """新しいプロセスで modules を順にインポートし、(最短のミリ秒, 読み込まれた重いライブラリ) を返す"""
+    code = _PROBE.format(modules=list(modules), heavy=HEAVY_MODULES)
+    best, heavy = None, []
+    for _ in range(REPEAT):
+        out = subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out)
+        best = result['ms'] if best is None else min(best, result['ms'])
+        heavy = result['heavy']
+    return best, heavy
+
+
+def main():
+    failures = []
+
+    base_ms, base_heavy = probe(['helhub'])
+    print(f"{'helhub のみ':<20}: {base_ms:8.1f} ms  重い依存: {', '.join(base_heavy) or '-'}")
+    if base_heavy:
+        failures.append(f"helhub のインポートで {base_heavy} が読み込まれました")
+
+    for command, (module, allowed) in COMMANDS.items():
+        ms, heavy = probe(['helhub', module])
+        unexpected = [m for m in heavy if m not in allowed]
+        mark = '  ← 許可していない依存' if unexpected else ''
+        print(f"{command:<20}: {ms:8.1f} ms  重い依存: {', '.join(heavy) or '-'}{mark}")
+        if unexpected:
+            failures.append(f"{command} で {unexpected} が読み込まれました")
+
+    all_modules = list(dict.fromkeys(module for module, _ in COMMANDS.values()))
+    eager_ms, _ = probe(all_modules + ['screenshot_util', 'helhub'])
+    print(f"{'(全モジュール)':<20}: {eager_ms:8.1f} ms  ← 遅延インポート導入前の helhub.py 相当")
+
+    for failure in failures:
+        print(f"!!! {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
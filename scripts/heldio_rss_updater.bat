@@ -1,3 +1,3 @@
 cd "C:\00work\OneDrive - keio.jp\zEtc\keioacjp\hellog\hellog-radio"
 cmd /c python "C:\00work\OneDrive - keio.jp\zEtc\keioacjp\hellog\hellog-radio\list_updater.py"
-C:\bin\WinSCP\WinSCP.com /script="C:\00work\OneDrive - keio.jp\zEtc\keioacjp\helhub\scripts\heldio_rss_updater.winscpscript"
+"C:\00work\OneDrive - keio.jp\zEtc\keioacjp\helhub\hhb.bat" deploy heldio-rss
@@ -1,2 +1 @@
-python "C:\00work\OneDrive - keio.jp\zEtc\keioacjp\helhub\scripts\hellog_updater_minimum_date_helper.py"
-C:\bin\WinSCP\WinSCP.com /script="C:\00work\OneDrive - keio.jp\zEtc\keioacjp\helhub\scripts\hellog_updater_minimum.winscpscript"
+"C:\00work\OneDrive - keio.jp\zEtc\keioacjp\helhub\hhb.bat" deploy hellog
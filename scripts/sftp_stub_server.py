@@ -0,0 +1,162 @@
+"""
+動作確認用の簡易 SFTP サーバー（paramiko）。
+
+指定したディレクトリをルートとして公開し、ユーザー名とパスワードが一致すればログインを許す。
+本物のサーバーに接続せずに `helhub.py deploy`（winscp_settings.backend: "sftp"）を試すためのもの。
+
+    python scripts/sftp_stub_server.py --root /tmp/sftp-root --port 2222 --user hel --password hel
+
+.env と config.json を次のようにすれば、/tmp/sftp-root の下にアップロードされる。
+    WINSCP_HOST_NAME=127.0.0.1 / WINSCP_USER_NAME=hel / WINSCP_PASSWORD=hel
+    winscp_settings: {"backend": "sftp", "port": 2222, "remote_directory": "/helhub/", ...}
+"""
+import os
+import socket
+import argparse
+import threading
+
+import paramiko
+from paramiko import SFTPServer, SFTPServerInterface, SFTPAttributes, SFTPHandle, SFTP_OK
+
+
+class _Handle(SFTPHandle):
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+
+class _RootedSFTP(SFTPServerInterface):
+    """ROOT の下だけを見せる SFTP の実装"""
+    ROOT = '.'
+
+    def _local(self, path):
+        path = self.canonicalize(path)
+        return os.path.join(self.ROOT, path.lstrip('/'))
+
+    def canonicalize(self, path):
+        return os.path.normpath('/' + path).replace(os.sep, '/')
+
+    def list_folder(self, path):
+        local = self._local(path)
+        try:
+            return [SFTPAttributes.from_stat(os.stat(os.path.join(local, name)), name)
+                    for name in os.listdir(local)]
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        local = self._local(path)
+        try:
+            fd = os.open(local, flags | getattr(os, 'O_BINARY', 0), 0o644)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        handle = _Handle(flags)
+        handle.filename = local
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        # SFTP の rename は上書きしない
+        if os.path.exists(self._local(newpath)):
+            return SFTPServer.convert_errno(17)  # EEXIST
+        return self.posix_rename(oldpath, newpath)
+
+    def posix_rename(self, oldpath, newpath):
+        try:
+            os.replace(self._local(oldpath), self._local(newpath))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        return SFTP_OK
+
+
+class _PasswordServer(paramiko.ServerInterface):
+    def __init__(self, user, password):
+        self.user, self.password = user, password
+
+    def check_auth_password(self, username, password):
+        if (username, password) == (self.user, self.password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == 'session' else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+def _serve_client(sock, host_key, user, password):
+    transport = paramiko.Transport(sock)
+    transport.add_server_key(host_key)
+    transport.set_subsystem_handler('sftp', SFTPServer, _RootedSFTP)
+    transport.start_server(server=_PasswordServer(user, password))
+    while transport.is_active():
+        transport.join(1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="動作確認用の簡易 SFTP サーバー")
+    ap.add_argument("--root", required=True, help="公開するディレクトリ")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=2222)
+    ap.add_argument("--user", default="hel")
+    ap.add_argument("--password", default="hel")
+    args = ap.parse_args()
+
+    os.makedirs(args.root, exist_ok=True)
+    _RootedSFTP.ROOT = os.path.abspath(args.root)
+    host_key = paramiko.RSAKey.generate(2048)
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((args.host, args.port))
+    server.listen(5)
+    print(f"SFTP サーバーを起動しました: sftp://{args.user}@{args.host}:{args.port}/ → {_RootedSFTP.ROOT}", flush=True)
+    while True:
+        sock, addr = server.accept()
+        print(f"接続: {addr[0]}:{addr[1]}", flush=True)
+        threading.Thread(target=_serve_client, args=(sock, host_key, args.user, args.password), daemon=True).start()
+
+
+if __name__ == '__main__':
+    main()
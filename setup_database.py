@@ -1,19 +1,14 @@
 import sqlite3
-import json
 
-def load_config():
-    """設定ファイルを読み込む"""
-    with open('config.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+from db_util import connect
+from config_util import load_config
 
-def setup_database():
-    """データベースのテーブルを初期化（作成）する"""
-    config = load_config()
-    db_path = config.get('database_path', 'content.db')
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+# ===== マイグレーション =====
+# スキーマの変更は必ずここに新しい番号で追加する（適用済みのものは書き換えない）。
+# schema_version を導入する前のDBにも安全に適用できるよう、各マイグレーションは
+# 既に同じテーブル・カラムがあっても失敗しないように書く。
 
+def _m001_initial_tables(cursor):
     # --- content テーブル ---
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS content (
@@ -55,12 +50,444 @@ def setup_database():
     )
     """)
 
+def _m002_feed_state_tables(cursor):
+    # --- feed_cache テーブル ---
+    # 条件付きGET (ETag / Last-Modified) と本文ハッシュによる「変更なし」判定用
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS feed_cache (
+        feed_url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        content_hash TEXT,
+        fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # --- feed_high_water テーブル ---
+    # フィードごとに「前回までに見た最新エントリー」を記録し、走査を新着分だけで打ち切る
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS feed_high_water (
+        feed_url TEXT PRIMARY KEY,
+        last_entry_id TEXT NOT NULL,
+        last_published_date TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def _m003_screenshot_jobs(cursor):
+    # --- screenshot_jobs テーブル ---
+    # fetch が積んだスクリーンショット撮影ジョブ。`helhub.py screenshots work` が処理し、
+    # 完了したら post_threads.image_path に結果を書き戻す
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS screenshot_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_thread_id INTEGER NOT NULL,
+        url TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending' CHECK(status IN ('pending', 'running', 'done', 'error')),
+        attempts INTEGER NOT NULL DEFAULT 0,
+        image_path TEXT,
+        error_message TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (post_thread_id) REFERENCES post_threads (id)
+    )
+    """)
+
+def _m004_screenshot_cache(cursor):
+    # --- screenshot_cache テーブル ---
+    # screenshots/ の索引。キャッシュの有無・TTL・サイズ上限 (LRU) の判定に使う
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS screenshot_cache (
+        slug TEXT PRIMARY KEY,
+        url TEXT, -- 索引を作る前に撮った画像を取り込んだ場合はNULL
+        image_path TEXT NOT NULL,
+        byte_size INTEGER NOT NULL DEFAULT 0, -- 派生画像 (*.x.jpg / *.x.webp) を含む
+        captured_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_screenshot_cache_last_used ON screenshot_cache (last_used_at)
+    """)
+
+# 日時文字列 → UNIX 秒。SQLite の日時関数は 'Z' / '+00:00' / オフセットなし (UTC) のどれも解釈できる
+_EPOCH_COLUMNS = [
+    # (テーブル, 日時文字列のカラム, UNIX 秒のカラム)
+    ("content", "published_date", "published_epoch"),
+    ("posts", "scheduled_at", "scheduled_epoch"),
+]
+
+def _m005_epoch_columns(cursor):
+    """
+    日時の範囲検索用の整数カラムを追加して既存の行の値を埋め、
+    以後はトリガーで文字列カラムと同期させる。
+    """
+    for table, text_column, epoch_column in _EPOCH_COLUMNS:
+        columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        if epoch_column not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {epoch_column} INTEGER")
+        cursor.execute(f"""
+            UPDATE {table} SET {epoch_column} = CAST(strftime('%s', {text_column}) AS INTEGER)
+             WHERE {epoch_column} IS NULL
+        """)
+
+        for event in ("INSERT", f"UPDATE OF {text_column}"):
+            suffix = "insert" if event == "INSERT" else "update"
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{epoch_column}_{suffix}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE {table} SET {epoch_column} = CAST(strftime('%s', NEW.{text_column}) AS INTEGER)
+                 WHERE id = NEW.id;
+            END
+            """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_content_published_epoch ON content (published_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_content_media_published_epoch ON content (media_id, published_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_status_scheduled_epoch ON posts (status, scheduled_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_scheduled_epoch ON posts (scheduled_epoch)")
+
+def _m006_hot_path_indexes(cursor):
+    """
+    よく使う検索を索引だけで完結させる（カバリングインデックス）。
+      - generate-js の新着/メディア別の最新件: content を published_epoch 順に media_id, title, link まで
+      - post-now / list の status + 予約日時: posts (status, scheduled_epoch)（005 で作成済み）
+      - 投稿ごとのスレッド取得: post_threads (post_id, thread_order)
+      - スクリーンショットジョブの取り出し: screenshot_jobs (status, id)
+    """
+    # 005 の単純な索引を、必要な列まで含むものに置き換える
+    cursor.execute("DROP INDEX IF EXISTS idx_content_published_epoch")
+    cursor.execute("DROP INDEX IF EXISTS idx_content_media_published_epoch")
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_content_published_cover
+        ON content (published_epoch, media_id, title, link)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_content_media_published_cover
+        ON content (media_id, published_epoch, title, link)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_post_threads_post_order
+        ON post_threads (post_id, thread_order)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_screenshot_jobs_status
+        ON screenshot_jobs (status, id)
+    """)
+
+def _m007_deploy_manifest(cursor):
+    # --- deploy_manifest テーブル ---
+    # 配信先ごとに、最後にアップロードしたファイルの内容のハッシュ。差分アップロードの判定に使う
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS deploy_manifest (
+        target TEXT NOT NULL,    -- config.json の deploy_targets のキー
+        path TEXT NOT NULL,      -- local_dir からの相対パス（/ 区切り）
+        remote_dir TEXT NOT NULL,
+        sha256 TEXT NOT NULL,
+        byte_size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL, -- これとサイズが変わっていなければハッシュを計算し直さない
+        deployed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (target, path)
+    )
+    """)
+
+# hub_snapshot に保持する件数（generate-js のカードごとの最新件数と「新着コンテンツ」の最大件数）。
+# 変えるときはトリガーを作り直す新しいマイグレーションを追加する
+HUB_SNAPSHOT_MEDIA_LIMIT = 5
+HUB_SNAPSHOT_RECENT_LIMIT = 10
+HUB_SNAPSHOT_RECENT_SCOPE = '*'
+
+_SNAPSHOT_COLUMNS = "scope, published_epoch, content_id, media_id, title, link"
+
+# 全体の最新 N 件（idx_content_published_cover を新しい順にたどる）
+_SNAPSHOT_RECENT_SELECT = f"""
+        SELECT '{HUB_SNAPSHOT_RECENT_SCOPE}', published_epoch, id, media_id, title, link FROM content
+         WHERE published_epoch IS NOT NULL
+         ORDER BY published_epoch DESC, id DESC
+         LIMIT {HUB_SNAPSHOT_RECENT_LIMIT}"""
+
+def _snapshot_refill_sql(scope_expr):
+    """トリガー本体: scope_expr（メディアID の式、または全体）の行を content から取り直す"""
+    if scope_expr == HUB_SNAPSHOT_RECENT_SCOPE:
+        scope_expr, select = f"'{HUB_SNAPSHOT_RECENT_SCOPE}'", _SNAPSHOT_RECENT_SELECT
+    else:
+        # メディアごとの最新 N 件（idx_content_media_published_cover をたどる）
+        select = f"""
+        SELECT media_id, published_epoch, id, media_id, title, link FROM content
+         WHERE media_id = {scope_expr} AND published_epoch IS NOT NULL
+         ORDER BY published_epoch DESC, id DESC
+         LIMIT {HUB_SNAPSHOT_MEDIA_LIMIT}"""
+    return f"""
+        DELETE FROM hub_snapshot WHERE scope = {scope_expr};
+        INSERT INTO hub_snapshot ({_SNAPSHOT_COLUMNS}){select};"""
+
+def _m008_hub_snapshot(cursor):
+    """
+    generate-js が読む「メディアごとの最新 N 件」と「全体の最新 N 件」を保持するテーブル。
+    content の変更のたびにトリガーが該当メディアと全体の分だけを索引から取り直すため、
+    generate-js はアーカイブの件数にかかわらずこのテーブルを1回読むだけで済む。
+    scope はメディアID（全体の最新は '*'）。「新着」の日数での絞り込みは読む側で行う。
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS hub_snapshot (
+        scope TEXT NOT NULL,
+        published_epoch INTEGER NOT NULL,
+        content_id INTEGER NOT NULL,
+        media_id TEXT NOT NULL,
+        title TEXT NOT NULL,
+        link TEXT NOT NULL,
+        PRIMARY KEY (scope, published_epoch DESC, content_id DESC)
+    ) WITHOUT ROWID
+    """)
+
+    # published_epoch は 005 のトリガーが INSERT の後に埋めるため、UPDATE OF published_epoch でも取り直す
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_content_hub_snapshot_insert
+    AFTER INSERT ON content
+    BEGIN{_snapshot_refill_sql("NEW.media_id")}{_snapshot_refill_sql(HUB_SNAPSHOT_RECENT_SCOPE)}
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_content_hub_snapshot_update
+    AFTER UPDATE OF media_id, title, link, published_epoch ON content
+    BEGIN{_snapshot_refill_sql("OLD.media_id")}{_snapshot_refill_sql("NEW.media_id")}{_snapshot_refill_sql(HUB_SNAPSHOT_RECENT_SCOPE)}
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_content_hub_snapshot_delete
+    AFTER DELETE ON content
+    BEGIN{_snapshot_refill_sql("OLD.media_id")}{_snapshot_refill_sql(HUB_SNAPSHOT_RECENT_SCOPE)}
+    END
+    """)
+
+    # 既存のデータから作る
+    cursor.execute("DELETE FROM hub_snapshot")
+    cursor.execute(f"""
+    INSERT INTO hub_snapshot ({_SNAPSHOT_COLUMNS})
+    SELECT media_id, published_epoch, id, media_id, title, link FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY media_id ORDER BY published_epoch DESC, id DESC) AS rank
+          FROM content WHERE published_epoch IS NOT NULL
+    ) WHERE rank <= {HUB_SNAPSHOT_MEDIA_LIMIT}
+    """)
+    cursor.execute(f"INSERT INTO hub_snapshot ({_SNAPSHOT_COLUMNS}){_SNAPSHOT_RECENT_SELECT}")
+
+# 過去の記事 (archive/) の1ページの件数。ページは古い順に番号を振り、トリガーが記事を入れるページを決める。
+# 変えるときはページを割り当て直す新しいマイグレーションを追加する
+ARCHIVE_PAGE_SIZE = 50
+
+def _archive_add_sql(row, guard="1"):
+    """
+    トリガー本体: row（NEW）の記事をページに入れる。
+      - 最後のページのどの記事よりも新しければ最後のページへ（満杯なら次のページを作る）
+      - それより古ければ、日付の範囲が合う既存のページへ（件数が ARCHIVE_PAGE_SIZE を超えてもよい）
+    さかのぼって追加された記事で後ろのページがずれることはなく、変わるのは入ったページだけ。
+    guard が偽のときは何もしない。
+    """
+    return f"""
+        INSERT INTO archive_items (content_id, media_id, page)
+        SELECT {row}.id, {row}.media_id, CASE
+                 WHEN last.page IS NULL THEN 1
+                 WHEN {row}.published_epoch >= last.last_epoch
+                     THEN last.page + (last.item_count >= {ARCHIVE_PAGE_SIZE})
+                 WHEN {row}.published_epoch >= last.first_epoch THEN last.page
+                 ELSE COALESCE((SELECT MAX(page) FROM archive_pages
+                                 WHERE media_id = {row}.media_id AND first_epoch <= {row}.published_epoch), 1)
+               END
+          FROM (SELECT 1) LEFT JOIN (
+                SELECT page, item_count, first_epoch, last_epoch FROM archive_pages
+                 WHERE media_id = {row}.media_id ORDER BY page DESC LIMIT 1
+          ) AS last ON 1
+         WHERE {guard};
+        INSERT INTO archive_pages (media_id, page, item_count, first_epoch, last_epoch, revision)
+        SELECT media_id, page, 1, {row}.published_epoch, {row}.published_epoch, 1
+          FROM archive_items WHERE content_id = {row}.id
+        ON CONFLICT (media_id, page) DO UPDATE SET
+            item_count = item_count + 1,
+            first_epoch = MIN(first_epoch, excluded.first_epoch),
+            last_epoch = MAX(last_epoch, excluded.last_epoch),
+            revision = revision + 1;"""
+
+def _archive_remove_sql(row):
+    """トリガー本体: row（OLD）の記事をページから外す（ページの番号と日付の範囲はそのまま）"""
+    return f"""
+        UPDATE archive_pages SET item_count = item_count - 1, revision = revision + 1
+         WHERE (media_id, page) = (SELECT media_id, page FROM archive_items WHERE content_id = {row}.id);
+        DELETE FROM archive_items WHERE content_id = {row}.id;"""
+
+def _m009_archive_pages(cursor):
+    """
+    過去の記事のページ分け。archive_items は記事 → ページ、archive_pages はページごとの件数・日付の範囲と
+    revision（中身が変わるたびに増える）。generate-js は archive_pages だけを読み、
+    書き出したときの revision (written_revision) と違うページだけを作り直す。
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS archive_items (
+        content_id INTEGER PRIMARY KEY,
+        media_id TEXT NOT NULL,
+        page INTEGER NOT NULL
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_items_page ON archive_items (media_id, page, content_id)")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS archive_pages (
+        media_id TEXT NOT NULL,
+        page INTEGER NOT NULL,
+        item_count INTEGER NOT NULL,
+        first_epoch INTEGER NOT NULL,
+        last_epoch INTEGER NOT NULL,
+        revision INTEGER NOT NULL,
+        written_revision INTEGER,   -- generate-js が最後に書き出したときの revision
+        sha256 TEXT,                -- そのときのファイルの内容のハッシュ（サイトが ?v= に使う）
+        PRIMARY KEY (media_id, page)
+    ) WITHOUT ROWID
+    """)
+
+    # INSERT では 005 のトリガーが必ず published_epoch を UPDATE で埋めるので、ページへの割り当ては UPDATE 側だけで行う
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_content_archive_move
+    AFTER UPDATE OF media_id, published_epoch ON content
+    WHEN OLD.media_id IS NOT NEW.media_id OR OLD.published_epoch IS NOT NEW.published_epoch
+      OR (NEW.published_epoch IS NOT NULL AND NOT EXISTS (SELECT 1 FROM archive_items WHERE content_id = NEW.id))
+    BEGIN{_archive_remove_sql("OLD")}{_archive_add_sql("NEW", guard="NEW.published_epoch IS NOT NULL")}
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_content_archive_edit
+    AFTER UPDATE OF title, link ON content
+    BEGIN
+        UPDATE archive_pages SET revision = revision + 1
+         WHERE (media_id, page) = (SELECT media_id, page FROM archive_items WHERE content_id = NEW.id);
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_content_archive_delete
+    AFTER DELETE ON content
+    BEGIN{_archive_remove_sql("OLD")}
+    END
+    """)
+
+    # 既存のデータを古い順に ARCHIVE_PAGE_SIZE 件ずつ分ける
+    cursor.execute("DELETE FROM archive_items")
+    cursor.execute("DELETE FROM archive_pages")
+    cursor.execute(f"""
+    INSERT INTO archive_items (content_id, media_id, page)
+    SELECT id, media_id,
+           (ROW_NUMBER() OVER (PARTITION BY media_id ORDER BY published_epoch, id) - 1) / {ARCHIVE_PAGE_SIZE} + 1
+      FROM content WHERE published_epoch IS NOT NULL
+    """)
+    cursor.execute("""
+    INSERT INTO archive_pages (media_id, page, item_count, first_epoch, last_epoch, revision)
+    SELECT a.media_id, a.page, COUNT(*), MIN(c.published_epoch), MAX(c.published_epoch), 1
+      FROM archive_items a JOIN content c ON c.id = a.content_id
+     GROUP BY a.media_id, a.page
+    """)
+
+# (バージョン, 説明, 適用する関数)。番号順に1回ずつ適用される
+MIGRATIONS = [
+    (1, "content / posts / post_threads テーブル", _m001_initial_tables),
+    (2, "feed_cache / feed_high_water テーブル", _m002_feed_state_tables),
+    (3, "screenshot_jobs テーブル", _m003_screenshot_jobs),
+    (4, "screenshot_cache テーブル", _m004_screenshot_cache),
+    (5, "published_epoch / scheduled_epoch カラムと同期トリガー", _m005_epoch_columns),
+    (6, "よく使う検索のためのカバリングインデックス", _m006_hot_path_indexes),
+    (7, "deploy_manifest テーブル", _m007_deploy_manifest),
+    (8, "hub_snapshot テーブルと同期トリガー", _m008_hub_snapshot),
+    (9, "archive_items / archive_pages テーブルと同期トリガー", _m009_archive_pages),
+]
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    """適用済みの最新バージョン（schema_version テーブルが無ければ 0）"""
+    exists = conn.execute("""
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'
+    """).fetchone()
+    if not exists:
+        return 0
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def migrate(conn, verbose=False):
+    """
+    未適用のマイグレーションを番号順に適用し、適用したバージョンのリストを返す。
+    1つのマイグレーションは1トランザクションで行い、失敗したらそのマイグレーションだけ
+    ロールバックして例外を送出する（それより前に適用したものは残る）。
+    別のプロセス（cron の update-web と post-now など）が同時に起動しても二重に適用しないよう、
+    BEGIN IMMEDIATE で書き込みロックを取ってから、トランザクションの中でバージョンを読み直す。
+    """
+    current = get_schema_version(conn)
+    if current >= LATEST_SCHEMA_VERSION:
+        return []
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
     conn.commit()
+
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            current = cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+            if version <= current:
+                # ロックを待っている間に別のプロセスが適用した
+                conn.commit()
+                continue
+            apply(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            print(f"!!! エラー: マイグレーション {version:03d} ({description}) に失敗しました。")
+            raise
+        applied.append(version)
+        if verbose:
+            print(f"  > {version:03d}: {description}")
+    return applied
+
+def create_tables(conn):
+    """
+    スキーマを最新にする（必要なテーブル・カラム・索引をすべて作成する）。
+    最新なら schema_version を1回読むだけで終わるため、各スクリプトの起動時に呼び出してよい。
+    """
+    applied = migrate(conn)
+    if applied:
+        print(f"データベースのスキーマを更新しました (バージョン {applied[-1]})。")
+
+def run_migrations():
+    """`helhub.py migrate`: 未適用のマイグレーションを表示しながら適用する"""
+    config = load_config()
+    db_path = config.get('database_path', 'content.db')
+
+    conn = connect(db_path, config)
+    current = get_schema_version(conn)
+    print(f"データベース '{db_path}' の現在のスキーマバージョン: {current}")
+    applied = migrate(conn, verbose=True)
+    if applied:
+        print(f"{len(applied)}件のマイグレーションを適用しました (バージョン {current} → {applied[-1]})。")
+    else:
+        print(f"スキーマは最新です (バージョン {LATEST_SCHEMA_VERSION})。")
+    conn.close()
+
+def setup_database():
+    """データベースのテーブルを初期化（作成）する"""
+    config = load_config()
+    db_path = config.get('database_path', 'content.db')
+
+    conn = connect(db_path, config)
+    migrate(conn)
     conn.close()
-    
+
     print(f"データベース '{db_path}' のセットアップが完了しました。")
 
 
 if __name__ == '__main__':
     setup_database()
-
@@ -1,138 +1,67 @@
-import subprocess
 import sys
-import json
-import os
-import tempfile
+import traceback
 from dotenv import load_dotenv
+from config_util import load_config
+from db_util import connect
+from fetch_feeds import process_feeds
+from generate_data_js import generate_data_js, site_data_is_current
+from build_site import build_site
+from deploy import deploy_target, SITE_TARGET
 
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
-def load_config():
-    """設定ファイルを読み込む"""
-    with open('config.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def run_script(script_name):
-    """指定されたPythonスクリプトを実行する"""
-    print(f"\n--- '{script_name}' を実行中... ---")
+def upload_via_winscp(config=None, conn=None, force=False):
+    """
+    ウェブサイトのファイルのうち、前回の配信から変わったものだけを WinSCP でアップロードする。
+    変わったファイルが無ければ WinSCP は起動しない（deploy.deploy_target を参照）。
+    """
+    return deploy_target(SITE_TARGET, config=config, conn=conn, force=force)
+
+def _stage(name):
+    print(f"\n=== {name} ===", flush=True)
+
+def main(force=False):
+    """
+    メインの処理: fetch → generate-js → build-site → upload を1つのプロセスで順に行う。
+    設定の読み込みとDB接続は全段で共有する。generate-js は配信する過去の記事 (archive/) と、
+    テンプレート確認用の hel-data.js（配信はしない）を更新する。fetch で新規コンテンツが無く、
+    config.json も変わっていなければ generate-js は省略する。
+    build-site は毎回行うが、描画結果が同じなら index.html も site.css も作り直さない。
+    upload は前回の配信から変わったファイルだけを送り、変わったファイルが無ければ WinSCP を
+    起動しない（force=True ならどちらも必ず行う）。
+    """
+    conn = None
     try:
-        result = subprocess.run(
-            [sys.executable, script_name], 
-            check=True, 
-            capture_output=True, 
-            text=True, 
-            encoding='utf-8',
-            errors='replace'
-        )
-        print(result.stdout)
-        if result.stderr:
-            print("--- エラー出力 ---")
-            print(result.stderr)
-        print(f"--- '{script_name}' の実行完了 ---")
-    except subprocess.CalledProcessError as e:
-        print(f"エラー: '{script_name}' の実行に失敗しました。")
-        print(e.stdout)
-        print(e.stderr)
-        raise
-
-def upload_via_winscp():
-    """WinSCPを使用してファイルをアップロードする（クリーンセッション版）"""
-    print("\n--- WinSCPによるファイルアップロードを開始... ---")
-    config = load_config()
-    settings = config.get('winscp_settings', {})
-
-    winscp_path = settings.get('winscp_executable_path')
-    if not winscp_path or not os.path.exists(winscp_path):
-        print(f"エラー: config.jsonに指定されたWinSCPの実行ファイルが見つかりません (パス: {winscp_path})。")
-        print("アップロードをスキップします。")
-        return
-
-    protocol = settings.get('protocol', 'sftp')
-    remote_dir = settings.get('remote_directory')
-    host = os.getenv('WINSCP_HOST_NAME')
-    user = os.getenv('WINSCP_USER_NAME')
-    password = os.getenv('WINSCP_PASSWORD')
-
-    if not all([host, user, password, remote_dir]):
-        print("エラー: WinSCP設定（ホスト名, ユーザー名, パスワード, リモートディレクトリ）が不足しています。")
-        print(".envファイルとconfig.jsonの設定を確認してください。")
-        print("アップロードをスキップします。")
-        return
-
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-
-    script_content = []
-    script_content.append(f'option batch abort')
-    script_content.append(f'option confirm off')
-    script_content.append(f'lcd "{script_dir}"')
-    script_content.append(f'open {protocol}://{user}:{password}@{host}/ -hostkey="*"')
-
-    files_to_upload = ['index.html', 'hel-data.js', 'README.md']
-    for file in files_to_upload:
-        if os.path.exists(file):
-            script_content.append(f'put "{file}" "{remote_dir}"')
-        else:
-            print(f"警告: アップロード対象のファイル '{file}' が見つかりません。")
-
-    script_content.append('exit')
-    
-    temp_script_path = ''
-    try:
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt', encoding='utf-8') as temp_script:
-            temp_script.write('\n'.join(script_content))
-            temp_script_path = temp_script.name
-
-        print("WinSCPコマンドを実行します...")
-        
-        # ★ 修正点: /ini=nul を追加して、保存済み設定を無視する
-        command = [winscp_path, "/ini=nul", f"/script={temp_script_path}", "/log=winscp.log"]
-        
-        result = subprocess.run(
-            command,
-            check=True,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace'
-        )
-        
-        print("--- WinSCP ログ ---")
-        print(result.stdout)
-        if result.stderr:
-            print("--- WinSCP エラーログ ---")
-            print(result.stderr)
-        print("--- ファイルアップロード完了 ---")
-
-    except subprocess.CalledProcessError as e:
-        print("エラー: WinSCPでのアップロードに失敗しました。")
-        print("--- WinSCP ログ (エラー) ---")
-        print(e.stdout)
-        print(e.stderr)
-        print("---")
-        print("考えられる原因:")
-        print("1. .envファイルのホスト名, ユーザー名, パスワードが間違っている。")
-        print("2. サーバー側のファイアウォールで接続が拒否されている。")
-        print("3. remote_directoryのパスが間違っている、または書き込み権限がない。")
-        
-        if os.path.exists('winscp.log'):
-            print("\n詳細な接続ログが winscp.log ファイルに出力されています。")
-        
-        raise
-    finally:
-        if os.path.exists(temp_script_path):
-            os.remove(temp_script_path)
-
-def main():
-    """メインの処理"""
-    try:
-        run_script('fetch_feeds.py')
-        run_script('generate_data_js.py')
-        upload_via_winscp()
+        config = load_config()
+        conn = connect(config=config)
+
+        _stage("1/4 フィードの取得 (fetch)")
+        new_count = process_feeds(config=config, conn=conn)
+
+        _stage("2/4 過去の記事と hel-data.js の生成 (generate-js)")
+        if new_count == 0 and not force and site_data_is_current(config):
+            print("新規コンテンツが無く、config.json も変更されていないため、生成を省略します。")
+        elif generate_data_js(config=config, conn=conn) is None:
+            raise RuntimeError("hel-data.js を生成できませんでした。")
+
+        _stage("3/4 index.html の描画 (build-site)")
+        built = build_site(config=config, conn=conn)
+        if built is None:
+            raise RuntimeError("index.html を作成できませんでした。")
+
+        _stage("4/4 アップロード")
+        if not built.changed:
+            # 書き換えていないので、mtime とサイズの比較だけで配信済みと判定できる
+            print("index.html に変更はありません。過去の記事などほかのファイルの変更だけを確認します。")
+        upload_via_winscp(config, conn=conn, force=force)
         print("\nすべての更新・アップロード処理が正常に完了しました。")
     except Exception:
+        traceback.print_exc()
         print(f"\n処理が中断されました。エラーログを確認してください。")
+    finally:
+        if conn is not None:
+            conn.close()
 
 if __name__ == '__main__':
-    main()
-
+    main(force='--force' in sys.argv[1:])